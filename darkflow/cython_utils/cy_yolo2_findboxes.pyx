@@ -46,52 +46,83 @@ cdef void _softmax_c(float* x, int classes):
         
         
 
-#BOX CONSTRUCTOR
+#CUT-OFF
+# an anchor scores at most its objectness: the softmax never exceeds 1.
+# The bound keeps a margin for float32 rounding in tempc and for numpy's
+# exp against libm, so the cut-off never drops a box that would pass.
+MAX_PROB_BOUND = 1.001
+
+#CANDIDATES
 @cython.cdivision(True)
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
-def box_constructor(meta,np.ndarray[float,ndim=3] net_out_in):
+def box_candidates(meta,np.ndarray[float,ndim=3] net_out_in):
+    """
+    Decodes only the anchors that can pass the threshold.
+    Returns (probs, bbox): one row per anchor with at least one class
+    above threshold, in anchor order, as float32 arrays of shape
+    (N, C) and (N, 5). Values are those of the dense decoder.
+    """
     cdef:
         np.intp_t H, W, _, C, B, row, col, box_loop, class_loop
-        np.intp_t row1, col1, box_loop1,index,index2
+        np.intp_t index, k, found = 0
         float  threshold = meta['thresh']
-        float tempc,arr_max=0,sum=0
+        float tempc,obj,arr_max=0,sum=0
+        bint keep
         double[:] anchors = np.asarray(meta['anchors'])
-        list boxes = list()
 
     H, W, _ = meta['out_size']
     C = meta['classes']
     B = meta['num']
-    
+
+    cdef float[:, ::1] net_out = net_out_in.reshape([H * W * B, net_out_in.shape[2]/B])
+
+    #PRE-FILTER, vectorized over every anchor
+    objectness = 1. / (1. + np.exp(-np.asarray(net_out[:, 4], dtype=np.float64)))
+    cdef np.intp_t[::1] candidates = np.flatnonzero(
+        objectness * MAX_PROB_BOUND > threshold).astype(np.intp)
+
     cdef:
-        float[:, :, :, ::1] net_out = net_out_in.reshape([H, W, B, net_out_in.shape[2]/B])
-        float[:, :, :, ::1] Classes = net_out[:, :, :, 5:]
-        float[:, :, :, ::1] Bbox_pred =  net_out[:, :, :, :5]
-        float[:, :, :, ::1] probs = np.zeros((H, W, B, C), dtype=np.float32)
-    
-    for row in range(H):
-        for col in range(W):
-            for box_loop in range(B):
-                arr_max=0
-                sum=0;
-                Bbox_pred[row, col, box_loop, 4] = expit_c(Bbox_pred[row, col, box_loop, 4])
-                Bbox_pred[row, col, box_loop, 0] = (col + expit_c(Bbox_pred[row, col, box_loop, 0])) / W
-                Bbox_pred[row, col, box_loop, 1] = (row + expit_c(Bbox_pred[row, col, box_loop, 1])) / H
-                Bbox_pred[row, col, box_loop, 2] = exp(Bbox_pred[row, col, box_loop, 2]) * anchors[2 * box_loop + 0] / W
-                Bbox_pred[row, col, box_loop, 3] = exp(Bbox_pred[row, col, box_loop, 3]) * anchors[2 * box_loop + 1] / H
-                #SOFTMAX BLOCK, no more pointer juggling
-                for class_loop in range(C):
-                    arr_max=max_c(arr_max,Classes[row,col,box_loop,class_loop])
-                
-                for class_loop in range(C):
-                    Classes[row,col,box_loop,class_loop]=exp(Classes[row,col,box_loop,class_loop]-arr_max)
-                    sum+=Classes[row,col,box_loop,class_loop]
-                
-                for class_loop in range(C):
-                    tempc = Classes[row, col, box_loop, class_loop] * Bbox_pred[row, col, box_loop, 4]/sum                    
-                    if(tempc > threshold):
-                        probs[row, col, box_loop, class_loop] = tempc
-    
-    
-    #NMS                    
-    return NMS(np.ascontiguousarray(probs).reshape(H*W*B,C), np.ascontiguousarray(Bbox_pred).reshape(H*B*W,5))
+        float[:, ::1] probs = np.zeros((candidates.shape[0], C), dtype=np.float32)
+        float[:, ::1] bbox = np.zeros((candidates.shape[0], 5), dtype=np.float32)
+
+    for k in range(candidates.shape[0]):
+        index = candidates[k]
+        row = index // (W * B)
+        col = index // B % W
+        box_loop = index % B
+        arr_max=0
+        sum=0
+        obj = expit_c(net_out[index, 4])
+        #SOFTMAX BLOCK, into the output row
+        for class_loop in range(C):
+            arr_max=max_c(arr_max,net_out[index,5 + class_loop])
+
+        for class_loop in range(C):
+            probs[found,class_loop]=exp(net_out[index,5 + class_loop]-arr_max)
+            sum+=probs[found,class_loop]
+
+        keep = False
+        for class_loop in range(C):
+            tempc = probs[found, class_loop] * obj/sum
+            if(tempc > threshold):
+                probs[found, class_loop] = tempc
+                keep = True
+            else:
+                probs[found, class_loop] = 0
+        if not keep: continue
+
+        bbox[found, 4] = obj
+        bbox[found, 0] = (col + expit_c(net_out[index, 0])) / W
+        bbox[found, 1] = (row + expit_c(net_out[index, 1])) / H
+        bbox[found, 2] = exp(net_out[index, 2]) * anchors[2 * box_loop + 0] / W
+        bbox[found, 3] = exp(net_out[index, 3]) * anchors[2 * box_loop + 1] / H
+        found += 1
+
+    return np.asarray(probs)[:found], np.asarray(bbox)[:found]
+
+#BOX CONSTRUCTOR
+def box_constructor(meta,np.ndarray[float,ndim=3] net_out_in, classes=None, agnostic=False, iou=0.4, top_k=0):
+    probs, bbox = box_candidates(meta, net_out_in)
+    #NMS, over the candidates only
+    return NMS(probs, bbox, classes, agnostic, iou, top_k)
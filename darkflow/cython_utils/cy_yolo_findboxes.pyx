@@ -8,22 +8,32 @@ from nms cimport NMS
 
 
 
+# a box scores at most max|class prob| times its running confidence
+# product. The bound keeps a margin for float32 rounding of that
+# product, so the cut-off never drops a box that would pass.
+MAX_PROB_BOUND = 1.001
+
 @cython.cdivision(True)
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
-def yolo_box_constructor(meta,np.ndarray[float] net_out, float threshold):
-
+def yolo_box_candidates(meta,np.ndarray[float] net_out, float threshold):
+    """
+    Decodes only the grid cells that can pass the threshold.
+    Returns (probs, bbox): one row per box with at least one class
+    above threshold, in box order, as float32 arrays of shape (N, C)
+    and (N, 5); the fifth bbox column is the box confidence.
+    """
     cdef:
         float sqrt
         int C,B,S
         int SS,prob_size,conf_size
-        int grid, b
+        int grid, b, k, found = 0
         int class_loop
+        float tempc
+        bint keep
 
-    
     sqrt =  meta['sqrt'] + 1
     C, B, S = meta['classes'], meta['num'], meta['side']
-    boxes = []
     SS        =  S * S # number of grid cells
     prob_size = SS * C # class probabilities
     conf_size = SS * B # confidences for each grid cell
@@ -32,20 +42,42 @@ def yolo_box_constructor(meta,np.ndarray[float] net_out, float threshold):
         float [:,::1] probs =  np.ascontiguousarray(net_out[0 : prob_size]).reshape([SS,C])
         float [:,::1] confs =  np.ascontiguousarray(net_out[prob_size : (prob_size + conf_size)]).reshape([SS,B])
         float [: , : ,::1] coords =  np.ascontiguousarray(net_out[(prob_size + conf_size) : ]).reshape([SS, B, 4])
-        float [:,:,::1] final_probs = np.zeros([SS,B,C],dtype=np.float32)
-        
-    
-    for grid in range(SS):
+
+    #PRE-FILTER, vectorized over every box
+    bound = np.abs(np.asarray(probs, dtype=np.float64)).max(axis=1)[:, None] * \
+        np.cumprod(np.abs(np.asarray(confs, dtype=np.float64)), axis=1)
+    cdef int[::1] candidates = np.flatnonzero(
+        (bound * MAX_PROB_BOUND > threshold).any(axis=1)).astype(np.intc)
+
+    cdef:
+        float [:,::1] final_probs = np.zeros([candidates.shape[0] * B, C], dtype=np.float32)
+        float [:,::1] final_bbox = np.zeros([candidates.shape[0] * B, 5], dtype=np.float32)
+
+    for k in range(candidates.shape[0]):
+        grid = candidates[k]
         for b in range(B):
-            coords[grid, b, 0] = (coords[grid, b, 0] + grid %  S) / S
-            coords[grid, b, 1] = (coords[grid, b, 1] + grid // S) / S
-            coords[grid, b, 2] =  coords[grid, b, 2] ** sqrt
-            coords[grid, b, 3] =  coords[grid, b, 3] ** sqrt
+            # class probabilities carry the confidences of earlier boxes
+            keep = False
             for class_loop in range(C):
                 probs[grid, class_loop] = probs[grid, class_loop] * confs[grid, b]
-                #print("PROBS",probs[grid,class_loop])
-                if(probs[grid,class_loop] > threshold ):
-                    final_probs[grid, b, class_loop] = probs[grid, class_loop]
-    
-    
-    return NMS(np.ascontiguousarray(final_probs).reshape(SS*B, C) , np.ascontiguousarray(coords).reshape(SS*B, 4))
+                tempc = probs[grid, class_loop]
+                if(tempc > threshold ):
+                    final_probs[found, class_loop] = tempc
+                    keep = True
+                else:
+                    final_probs[found, class_loop] = 0
+            if not keep: continue
+
+            final_bbox[found, 0] = (coords[grid, b, 0] + grid %  S) / S
+            final_bbox[found, 1] = (coords[grid, b, 1] + grid // S) / S
+            final_bbox[found, 2] =  coords[grid, b, 2] ** sqrt
+            final_bbox[found, 3] =  coords[grid, b, 3] ** sqrt
+            final_bbox[found, 4] =  confs[grid, b]
+            found += 1
+
+    return np.asarray(final_probs)[:found], np.asarray(final_bbox)[:found]
+
+def yolo_box_constructor(meta,np.ndarray[float] net_out, float threshold, classes=None, agnostic=False, iou=0.4, top_k=0):
+    probs, bbox = yolo_box_candidates(meta, net_out, threshold)
+    #NMS, over the candidates only
+    return NMS(probs, bbox, classes, agnostic, iou, top_k)
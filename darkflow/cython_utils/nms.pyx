@@ -60,72 +60,79 @@ cdef float box_iou_c(float ax, float ay, float aw, float ah, float bx, float by,
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef NMS(float[:, ::1] final_probs , float[:, ::1] final_bbox):
+cdef NMS(float[:, ::1] final_probs , float[:, ::1] final_bbox, classes=None, bint agnostic=False, float iou=0.4, int top_k=0):
+    """
+    Sort-based greedy NMS over candidate rows (the boxes that passed
+    the threshold): per class, the highest score is kept and every box
+    overlapping it by IoU >= iou is dropped, then the next survivor.
+    classes: ids to keep, all when None; other classes are zeroed.
+    agnostic: merge across the kept classes, each box scored by its best.
+    top_k: return at most this many boxes, best first; 0 for no cap.
+    It is applied after the per-class results are merged, so every
+    class is suppressed in full and the boxes keep all their scores.
+    """
     cdef list boxes = list()
-    cdef set indices = set()
     cdef:
-        np.intp_t pred_length,class_length,class_loop,index,index2
+        np.intp_t pred_length,class_length,i,j,first,last,index,index2
 
-  
     pred_length = final_bbox.shape[0]
     class_length = final_probs.shape[1]
-    for class_loop in range(class_length):
-        for index in range(pred_length):
-            if final_probs[index,class_loop] == 0: continue
-            for index2 in range(index+1,pred_length):
-                if final_probs[index2,class_loop] == 0: continue
-                if index==index2 : continue
-                if box_iou_c(final_bbox[index,0],final_bbox[index,1],final_bbox[index,2],final_bbox[index,3],final_bbox[index2,0],final_bbox[index2,1],final_bbox[index2,2],final_bbox[index2,3]) >= 0.4:
-                    if final_probs[index2,class_loop] > final_probs[index, class_loop] :
-                        final_probs[index, class_loop] =0
-                        break
-                    final_probs[index2,class_loop]=0
-            
-            if index not in indices:
-                bb=BoundBox(class_length)
-                bb.x = final_bbox[index, 0]
-                bb.y = final_bbox[index, 1]
-                bb.w = final_bbox[index, 2]
-                bb.h = final_bbox[index, 3]
-                bb.c = final_bbox[index, 4]
-                bb.probs = np.asarray(final_probs[index,:])
-                boxes.append(bb)
-                indices.add(index)
-    return boxes
+    if pred_length == 0: return boxes
+    probs = np.asarray(final_probs)
+    columns = np.arange(class_length) if classes is None else np.asarray(classes, dtype=np.intp)
+    out = np.zeros((pred_length, class_length), dtype=np.float32)
+
+    #one sort: grouped by class (one group if agnostic), best score first
+    scores = probs[:, columns]
+    if agnostic:
+        rows = np.flatnonzero((scores != 0).any(axis=1))
+        group = np.zeros(len(rows), dtype=np.intp)
+        score = scores[rows].max(axis=1)
+    else:
+        rows, group = np.nonzero(scores)
+        score = scores[rows, group]
+    order = np.lexsort((-score, group))
+
+    cdef:
+        np.intp_t[::1] sorted_rows = rows[order].astype(np.intp)
+        np.intp_t[::1] sorted_group = group[order].astype(np.intp)
+        np.uint8_t[::1] suppressed = np.zeros(len(order), dtype=np.uint8)
+        np.uint8_t[::1] keep = np.zeros(len(order), dtype=np.uint8)
 
-# cdef NMS(float[:, ::1] final_probs , float[:, ::1] final_bbox):
-#     cdef list boxes = list()
-#     cdef:
-#         np.intp_t pred_length,class_length,class_loop,index,index2, i, j
-
-  
-#     pred_length = final_bbox.shape[0]
-#     class_length = final_probs.shape[1]
-
-#     for class_loop in range(class_length):
-#         order = np.argsort(final_probs[:,class_loop])[::-1]
-#         # First box
-#         for i in range(pred_length):
-#             index = order[i]
-#             if final_probs[index, class_loop] == 0.: 
-#                 continue
-#             # Second box
-#             for j in range(i+1, pred_length):
-#                 index2 = order[j]
-#                 if box_iou_c(
-#                     final_bbox[index,0],final_bbox[index,1],
-#                     final_bbox[index,2],final_bbox[index,3],
-#                     final_bbox[index2,0],final_bbox[index2,1],
-#                     final_bbox[index2,2],final_bbox[index2,3]) >= 0.4:
-#                     final_probs[index2, class_loop] = 0.
-                    
-#             bb = BoundBox(class_length)
-#             bb.x = final_bbox[index, 0]
-#             bb.y = final_bbox[index, 1]
-#             bb.w = final_bbox[index, 2]
-#             bb.h = final_bbox[index, 3]
-#             bb.c = final_bbox[index, 4]
-#             bb.probs = np.asarray(final_probs[index,:])
-#             boxes.append(bb)
-  
-#     return boxes
+    first = 0
+    while first < sorted_rows.shape[0]:
+        last = first
+        while last < sorted_rows.shape[0] and sorted_group[last] == sorted_group[first]:
+            last += 1
+        for i in range(first, last):
+            if suppressed[i]: continue
+            keep[i] = 1
+            index = sorted_rows[i]
+            for j in range(i + 1, last):
+                if suppressed[j]: continue
+                index2 = sorted_rows[j]
+                if box_iou_c(final_bbox[index,0],final_bbox[index,1],final_bbox[index,2],final_bbox[index,3],final_bbox[index2,0],final_bbox[index2,1],final_bbox[index2,2],final_bbox[index2,3]) >= iou:
+                    suppressed[j] = 1
+        first = last
+
+    kept_at = np.flatnonzero(np.asarray(keep))
+    kept_rows = rows[order][kept_at]
+    if agnostic:
+        out[kept_rows[:, None], columns] = scores[kept_rows]
+    else:
+        out[kept_rows, columns[group[order][kept_at]]] = score[order][kept_at]
+
+    #one box per surviving row, best first
+    survivors = np.unique(kept_rows)
+    survivors = survivors[np.argsort(-out[survivors].max(axis=1), kind='stable')]
+    if top_k: survivors = survivors[:top_k]
+    for index in survivors:
+        bb=BoundBox(class_length)
+        bb.x = final_bbox[index, 0]
+        bb.y = final_bbox[index, 1]
+        bb.w = final_bbox[index, 2]
+        bb.h = final_bbox[index, 3]
+        bb.c = final_bbox[index, 4]
+        bb.probs = out[index]
+        boxes.append(bb)
+    return boxes
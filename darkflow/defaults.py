@@ -15,6 +15,10 @@ class argHandler(dict):
         self.define('summary', '', 'path to TensorBoard summaries directory')
         self.define('annotation', '../pascal/VOCdevkit/ANN/', 'path to annotation directory')
         self.define('threshold', -0.1, 'detection threshold')
+        self.define('iou', 0.4, 'NMS drops a box overlapping a better one by this IoU or more')
+        self.define('nmsClasses', '', 'comma separated labels kept by NMS, all if empty')
+        self.define('agnostic', False, 'NMS merges overlapping boxes across the kept classes')
+        self.define('topK', 0, 'keep at most this many boxes per image after NMS, 0 for no cap')
         self.define('model', '', 'configuration of choice')
         self.define('trainer', 'rmsprop', 'training algorithm')
         self.define('momentum', 0.0, 'applicable for rmsprop and momentum optimizers')
@@ -31,6 +35,8 @@ class argHandler(dict):
         self.define('save', 2000, 'save checkpoint every ? training examples')
         self.define('demo', '', 'demo on webcam')
         self.define('queue', 1, 'process demo in batch')
+        self.define('pipeline', False, 'run the demo as a capture / preprocess / inference / postprocess pipeline')
+        self.define('workers', 2, 'preprocessing threads of the --pipeline demo')
         self.define('json', False, 'Outputs bounding box information in json format.')
         self.define('saveVideo', False, 'Records video from input video or camera')
         self.define('pbLoad', '', 'path to .pb protobuf file (metaLoad must also be specified)')
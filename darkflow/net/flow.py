@@ -3,6 +3,7 @@ import time
 import numpy as np
 import tensorflow as tf
 import pickle
+import threading
 from multiprocessing.pool import ThreadPool
 
 train_stats = (
@@ -13,6 +14,7 @@ train_stats = (
     '\tBackup every  : {}'
 )
 pool = ThreadPool()
+_inputs = threading.local() # per-thread input batch for return_predict*
 
 def _save_ckpt(self, step, loss_profile):
     file = '{}-{}{}'
@@ -73,15 +75,8 @@ def train(self):
 
     if ckpt: _save_ckpt(self, *args)
 
-def return_predict(self, im):
-    assert isinstance(im, np.ndarray), \
-				'Image is not a np.ndarray'
-    h, w, _ = im.shape
-    im = self.framework.resize_input(im)
-    this_inp = np.expand_dims(im, 0)
-    feed_dict = {self.inp : this_inp}
-
-    out = self.sess.run(self.out, feed_dict)[0]
+def _boxes_info(self, out, h, w):
+    """Detections of one net output, in the coordinates of an h x w image."""
     boxes = self.framework.findboxes(out)
     threshold = self.FLAGS.threshold
     boxesInfo = list()
@@ -101,6 +96,53 @@ def return_predict(self, im):
         })
     return boxesInfo
 
+def _batch_input(self, n):
+    """
+    Preallocated [n, H, W, C] float32 input tensor, reused across calls
+    on the same thread, so threads sharing one net never overwrite each
+    other's input before sess.run.
+    """
+    shape = list(self.meta['inp_size'])
+    inp = getattr(_inputs, 'batch', None)
+    if inp is None or len(inp) < n or list(inp.shape[1:]) != shape:
+        inp = _inputs.batch = np.empty([n] + shape, np.float32)
+    return inp[:n]
+
+def return_predict(self, im):
+    assert isinstance(im, np.ndarray), \
+				'Image is not a np.ndarray'
+    h, w, _ = im.shape
+    this_inp = _batch_input(self, 1)
+    self.framework.resize_input(im, this_inp[0])
+    feed_dict = {self.inp : this_inp}
+
+    out = self.sess.run(self.out, feed_dict)[0]
+    return _boxes_info(self, out, h, w)
+
+def return_predict_batch(self, images):
+    """
+    Like return_predict, for a list of images of any sizes at once: every
+    image is resized into one preallocated float32 batch, the net runs
+    once, and each image gets its own list of detections, scaled back to
+    its own h, w.
+    """
+    for im in images:
+        assert isinstance(im, np.ndarray), \
+				'Image is not a np.ndarray'
+    if not len(images):
+        return list()
+    this_inp = _batch_input(self, len(images))
+    sizes = list()
+    for i, im in enumerate(images):
+        h, w, _ = im.shape
+        sizes.append((h, w))
+        self.framework.resize_input(im, this_inp[i])
+    feed_dict = {self.inp : this_inp}
+
+    out = self.sess.run(self.out, feed_dict)
+    return [_boxes_info(self, single_out, h, w)
+        for single_out, (h, w) in zip(out, sizes)]
+
 import math
 
 def predict(self):
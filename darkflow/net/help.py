@@ -2,6 +2,7 @@
 tfnet secondary (helper) methods
 """
 from ..utils.loader import create_loader
+from . import pipeline
 from time import time as timer
 import tensorflow as tf
 import numpy as np
@@ -103,6 +104,16 @@ def camera(self):
         videoWriter = cv2.VideoWriter(
             'video.avi', fourcc, fps, (width, height))
 
+    if self.FLAGS.pipeline:
+        pipeline.camera(self, camera,
+            videoWriter if SaveVideo else None, file == 0)
+        if SaveVideo:
+            videoWriter.release()
+        camera.release()
+        if file == 0: #camera window
+            cv2.destroyAllWindows()
+        return
+
     # buffers for demo in batch
     buffer_inp = list()
     buffer_pre = list()
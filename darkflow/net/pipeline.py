@@ -0,0 +1,190 @@
+"""
+pipelined demo: capture, preprocess, inference and postprocess
+run concurrently, connected by bounded queues
+"""
+from time import time as timer
+from threading import Thread, Event
+from collections import deque
+import heapq
+import queue
+import sys
+import numpy as np
+import cv2
+
+_DONE = None # end of stream marker
+
+class StageStats(object):
+    """
+    Seconds spent per frame in every stage, for the report at exit.
+    The mean covers the whole run; percentiles cover the last `window`
+    frames, so memory stays bounded however long the camera runs.
+    """
+
+    def __init__(self, stages, window = 9000):
+        self.stages = stages
+        self.times = dict((stage, deque(maxlen = window)) for stage in stages)
+        self.count = dict((stage, 0) for stage in stages)
+        self.total = dict((stage, 0.) for stage in stages)
+
+    def add(self, stage, seconds):
+        self.times[stage].append(seconds)
+        self.count[stage] += 1
+        self.total[stage] += seconds
+
+    def report(self, frames, elapsed):
+        lines = ['{:>12} {:>9} {:>9} {:>9}   (ms per frame)'.format(
+            'stage', 'mean', 'p50', 'p95')]
+        for stage in self.stages:
+            if not self.count[stage]: continue
+            values = np.array(self.times[stage]) * 1000.
+            mean = self.total[stage] / self.count[stage] * 1000.
+            lines.append('{:>12} {:9.2f} {:9.2f} {:9.2f}'.format(
+                stage, mean, *np.percentile(values, (50, 95))))
+        lines.append('{} frames in {:.2f}s = {:.2f} FPS end to end'.format(
+            frames, elapsed, frames / elapsed if elapsed else 0.))
+        return '\n'.join(lines)
+
+def _put(q, item, stop):
+    # a bounded put that gives up once the pipeline is stopping
+    while not stop.is_set():
+        try:
+            q.put(item, timeout = .1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q, stop):
+    # a get that gives up once the pipeline is stopping
+    while not stop.is_set():
+        try:
+            return q.get(timeout = .1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+def _capture(camera, out, stop, stats, workers):
+    index = 0
+    while camera.isOpened() and not stop.is_set():
+        start = timer()
+        _, frame = camera.read()
+        if frame is None: break
+        stats.add('capture', timer() - start)
+        if not _put(out, (index, frame, start), stop): break
+        index += 1
+    for _ in range(workers):
+        _put(out, _DONE, stop)
+
+def _preprocess(self, inp, out, stop, stats, slots, free):
+    while not stop.is_set():
+        item = _get(inp, stop)
+        if item is _DONE: break
+        index, frame, captured = item
+        slot = _get(free, stop)
+        if slot is _DONE: break
+        start = timer()
+        self.framework.resize_input(frame, slots[slot])
+        stats.add('preprocess', timer() - start)
+        if not _put(out, (index, frame, captured, slot), stop):
+            return
+    _put(out, _DONE, stop)
+
+def _infer(self, inp, out, stop, stats, workers, slots, free, feed):
+    finished = 0
+    while finished < workers and not stop.is_set():
+        # wait for one frame, then take whatever else is ready
+        ready = [_get(inp, stop)]
+        while len(ready) < len(feed):
+            try: ready.append(inp.get_nowait())
+            except queue.Empty: break
+        finished += sum(item is _DONE for item in ready)
+        ready = [item for item in ready if item is not _DONE]
+        if not ready: continue
+
+        start = timer()
+        taken = [item[3] for item in ready]
+        this_inp = feed[:len(ready)]
+        np.take(slots, taken, axis = 0, out = this_inp)
+        for slot in taken: free.put(slot)
+        net_out = self.sess.run(self.out, {self.inp: this_inp})
+        elapsed = timer() - start
+        for item, single_out in zip(ready, net_out):
+            stats.add('inference', elapsed / len(ready))
+            if not _put(out, (item[0], item[1], item[2], single_out), stop):
+                return
+    _put(out, _DONE, stop)
+
+def camera(self, camera, videoWriter, show):
+    """
+    Runs the demo as four stages:
+        capture     one thread reading frames
+        preprocess  FLAGS.workers threads
+        inference   one thread, batching up to FLAGS.queue ready frames
+        postprocess the calling thread: draw, encode, display in order
+    Each stage feeds the next through a bounded queue, so frames
+    are decoded and preprocessed while the net runs. Preprocessing
+    resizes straight into a fixed pool of input slots and inference
+    gathers its batch into one reused tensor, so no input arrays are
+    allocated per frame.
+    """
+    workers = max(1, self.FLAGS.workers)
+    batch = max(1, self.FLAGS.queue)
+    stop = Event()
+    stats = StageStats(('capture', 'preprocess', 'inference', 'postprocess', 'latency'))
+    raw = queue.Queue(maxsize = 2 * batch)
+    pre = queue.Queue(maxsize = 2 * batch)
+    post = queue.Queue(maxsize = 2 * batch)
+    # enough slots for every frame queued for or inside preprocess and inference
+    shape = list(self.meta['inp_size'])
+    slots = np.empty([pre.maxsize + workers + batch] + shape, np.float32)
+    free = queue.Queue()
+    for slot in range(len(slots)): free.put(slot)
+    feed = np.empty([batch] + shape, np.float32)
+
+    threads = [Thread(target = _capture,
+        args = (camera, raw, stop, stats, workers))]
+    threads += [Thread(target = _preprocess,
+        args = (self, raw, pre, stop, stats, slots, free)) for _ in range(workers)]
+    threads += [Thread(target = _infer,
+        args = (self, pre, post, stop, stats, workers, slots, free, feed))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    # frames can leave the preprocess pool out of order: re-sequence them
+    pending = list(); expected = 0
+    elapsed = int()
+    start = timer()
+    self.say('Press [ESC] to quit demo')
+    while True:
+        item = post.get()
+        if item is _DONE: break
+        heapq.heappush(pending, (item[0], item)) # indices are unique
+        while pending and pending[0][0] == expected:
+            _, (index, frame, captured, net_out) = heapq.heappop(pending)
+            expected += 1
+            begin = timer()
+            postprocessed = self.framework.postprocess(
+                net_out, frame, False)
+            if videoWriter is not None:
+                videoWriter.write(postprocessed)
+            if show: cv2.imshow('', postprocessed)
+            done = timer()
+            stats.add('postprocess', done - begin)
+            stats.add('latency', done - captured)
+            elapsed += 1
+
+            if elapsed % 5 == 0:
+                sys.stdout.write('\r')
+                sys.stdout.write('{0:3.3f} FPS'.format(
+                    elapsed / (timer() - start)))
+                sys.stdout.flush()
+        if show and cv2.waitKey(1) == 27: break
+
+    stop.set()
+    # every stage polls `stop`; capture may still be inside camera.read()
+    threads[0].join(1.)
+    for thread in threads[1:]:
+        thread.join()
+    sys.stdout.write('\n')
+    self.say(stats.report(elapsed, timer() - start))
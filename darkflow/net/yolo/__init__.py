@@ -34,4 +34,14 @@ def constructor(self, meta, FLAGS):
 
 	# over-ride the threshold in meta if FLAGS has it.
 	if FLAGS.threshold > 0.0:
-		self.meta['thresh'] = FLAGS.threshold
\ No newline at end of file
+		self.meta['thresh'] = FLAGS.threshold
+
+	# NMS settings for findboxes, class names resolved to ids
+	names = FLAGS.nmsClasses
+	if isinstance(names, str):
+		names = [name.strip() for name in names.split(',') if name.strip()]
+	unknown = [name for name in names if name not in meta['labels']]
+	assert not unknown, 'unknown nmsClasses: {}'.format(', '.join(unknown))
+	self.nms = dict(
+		classes = [meta['labels'].index(name) for name in names] or None,
+		agnostic = FLAGS.agnostic, iou = FLAGS.iou, top_k = FLAGS.topK)
\ No newline at end of file
@@ -4,6 +4,7 @@ import numpy as np
 import cv2
 import os
 import json
+import threading
 from ...cython_utils.cy_yolo_findboxes import yolo_box_constructor
 
 def _fix(obj, dims, scale, offs):
@@ -13,12 +14,30 @@ def _fix(obj, dims, scale, offs):
 		obj[i] = int(obj[i] * scale - off)
 		obj[i] = max(min(obj[i], dim), 0)
 
-def resize_input(self, im):
+_scratch = threading.local() # per-thread uint8 resize buffer
+
+def resize_input(self, im, out = None):
+	"""
+	Resize im to the net input, swap BGR to RGB and scale to [0, 1]
+	as float32, writing into out (e.g. a slot of the batch fed to
+	self.inp) when given. cv2.resize fills a reused uint8 buffer and
+	one float32 divide does the swap and the scaling, so no float64
+	or strided copies are made. float32(x / 255) is the same value the
+	float64 path gave after TensorFlow's cast on feed. Frames of any
+	other dtype are resized into a fresh array of their own dtype.
+	"""
 	h, w, c = self.meta['inp_size']
-	imsz = cv2.resize(im, (w, h))
-	imsz = imsz / 255.
-	imsz = imsz[:,:,::-1]
-	return imsz
+	buf = None
+	if im.dtype == np.uint8:
+		buf = getattr(_scratch, 'buf', None)
+		if buf is None or buf.shape != (h, w, c):
+			buf = _scratch.buf = np.empty((h, w, c), np.uint8)
+	if out is None:
+		out = np.empty((h, w, c), np.float32)
+	# cv2 only writes into dst when it matches, so always take what it returns
+	buf = cv2.resize(im, (w, h), dst = buf)
+	np.divide(buf[:,:,::-1], 255., out = out, dtype = np.float32)
+	return out
 
 def process_box(self, b, h, w, threshold):
 	max_indx = np.argmax(b.probs)
@@ -42,7 +61,7 @@ def findboxes(self, net_out):
 	threshold = FLAGS.threshold
 	
 	boxes = []
-	boxes = yolo_box_constructor(meta, net_out, threshold)
+	boxes = yolo_box_constructor(meta, net_out, threshold, **self.nms)
 	
 	return boxes
 
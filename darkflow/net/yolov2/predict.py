@@ -21,7 +21,7 @@ def findboxes(self, net_out):
 	# meta
 	meta = self.meta
 	boxes = list()
-	boxes=box_constructor(meta,net_out)
+	boxes=box_constructor(meta,net_out,**self.nms)
 	return boxes
 
 def postprocess(self, net_out, im, save = True):
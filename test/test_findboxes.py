@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+cy_yolo2 = pytest.importorskip('darkflow.cython_utils.cy_yolo2_findboxes')
+cy_yolo = pytest.importorskip('darkflow.cython_utils.cy_yolo_findboxes')
+
+
+# With MAX_PROB_BOUND at infinity the pre-filter passes every anchor, so
+# the decoder runs dense: every anchor goes through the same C arithmetic
+# and the threshold alone decides. The pre-filtered decode must give the
+# same rows, bit for bit.
+@pytest.fixture
+def dense(monkeypatch):
+    def decode(module, function, *args):
+        monkeypatch.setattr(module, 'MAX_PROB_BOUND', np.inf)
+        try:
+            return function(*args)
+        finally:
+            monkeypatch.undo()
+    return decode
+
+
+def _same(filtered, dense):
+    probs, bbox = filtered
+    dense_probs, dense_bbox = dense
+    assert probs.dtype == dense_probs.dtype == np.float32
+    assert np.array_equal(probs, dense_probs)
+    assert np.array_equal(bbox, dense_bbox)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('thresh', [0.1, 0.3, 0.6])
+def test_yolo2_candidates_match_dense(dense, seed, thresh):
+    H, W, B, C = 13, 13, 5, 20
+    rng = np.random.RandomState(seed)
+    meta = dict(out_size=(H, W, B * (5 + C)), classes=C, num=B, thresh=thresh,
+                anchors=list(rng.uniform(0.5, 10., 2 * B)))
+    net_out = (rng.randn(H, W, B * (5 + C)) * 3).astype(np.float32)
+    filtered = cy_yolo2.box_candidates(meta, net_out.copy())
+    assert len(filtered[0])
+    _same(filtered, dense(cy_yolo2, cy_yolo2.box_candidates, meta, net_out.copy()))
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('thresh', [0.05, 0.2, 0.4])
+def test_yolo_candidates_match_dense(dense, seed, thresh):
+    S, B, C = 7, 2, 20
+    rng = np.random.RandomState(seed)
+    meta = dict(sqrt=1, classes=C, num=B, side=S)
+    # class probabilities and confidences are activations in [0, 1)
+    net_out = np.concatenate([rng.rand(S * S * C) ** 2, rng.rand(S * S * B), rng.rand(S * S * B * 4)]).astype(np.float32)
+    filtered = cy_yolo.yolo_box_candidates(meta, net_out.copy(), thresh)
+    assert len(filtered[0])
+    _same(filtered, dense(cy_yolo, cy_yolo.yolo_box_candidates, meta, net_out.copy(), thresh))
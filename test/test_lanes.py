@@ -0,0 +1,87 @@
+from trafficsim.lanes import LaneQueue
+from trafficsim.state import VehicleState
+
+
+def _lane(count):
+    state = VehicleState(capacity=4)
+    slots = [state.add(x=float(i)) for i in range(count)]
+    lane = LaneQueue(state, slots)
+    for slot in slots:
+        lane.append(slot)
+    return state, lane, slots
+
+
+def _check(state, lane, expected):
+    assert list(lane.slots()) == expected
+    assert len(lane) == len(expected)
+    assert lane.head == (expected[0] if expected else -1)
+    assert lane.tail == (expected[-1] if expected else -1)
+    for front, back in zip([-1] + expected, expected + [-1]):
+        if back >= 0:
+            assert state.leader[back] == front
+        if front >= 0:
+            assert state.follower[front] == back
+
+
+def test_append_links_front_to_back():
+    state, lane, slots = _lane(5)
+    _check(state, lane, slots)
+    assert list(lane) == slots  # handles come back in the same order
+
+
+def test_remove_head_middle_tail_and_last():
+    state, lane, slots = _lane(4)
+    lane.remove(slots[0])
+    _check(state, lane, slots[1:])
+    lane.remove(slots[2])
+    _check(state, lane, [slots[1], slots[3]])
+    lane.remove(slots[3])
+    _check(state, lane, [slots[1]])
+    lane.remove(slots[1])
+    _check(state, lane, [])
+    assert state.leader[slots[1]] == state.follower[slots[1]] == -1
+
+
+def test_append_after_emptying():
+    state, lane, slots = _lane(2)
+    for slot in slots:
+        lane.remove(slot)
+    lane.append(slots[1])
+    _check(state, lane, [slots[1]])
+
+
+def test_merge_orders_by_progress():
+    # progress = x: the head is the vehicle furthest along
+    state = VehicleState(capacity=4)
+    lane = LaneQueue(state, None)
+    progress = lambda slot: state.x[slot]
+    ahead, behind = state.add(x=100.), state.add(x=10.)
+    lane.append(ahead)
+    lane.append(behind)
+    middle, front, back = state.add(x=50.), state.add(x=200.), state.add(x=0.)
+    lane.merge(middle, progress)
+    lane.merge(front, progress)
+    lane.merge(back, progress)
+    _check(state, lane, [front, ahead, middle, behind, back])
+
+
+def test_merge_into_empty_lane_and_ties():
+    state = VehicleState(capacity=4)
+    lane = LaneQueue(state, None)
+    progress = lambda slot: state.x[slot]
+    first = state.add(x=10.)
+    lane.merge(first, progress)
+    _check(state, lane, [first])
+    # a vehicle level with one already queued goes behind it
+    level = state.add(x=10.)
+    lane.merge(level, progress)
+    _check(state, lane, [first, level])
+
+
+def test_links_survive_state_growth():
+    state, lane, slots = _lane(4)
+    extra = [state.add() for _ in range(8)]  # capacity 4 -> 16
+    for slot in extra:
+        lane.append(slot)
+    lane.remove(slots[1])
+    _check(state, lane, [slots[0]] + slots[2:] + extra)
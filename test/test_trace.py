@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from trafficsim.engine import SimulationEngine
+from trafficsim.trace import TraceReader, TraceWriter, record
+
+
+def test_trace_round_trip(tmp_path):
+    path = str(tmp_path / 'run.trace')
+    engine = SimulationEngine(seed=5, simTime=30)
+    writer = record(engine, path, chunkTicks=64)   # several chunks and a partial last one
+    snapshots = []
+
+    def snapshot(engine):
+        st = engine.state
+        live = np.flatnonzero(st.view('alive'))
+        snapshots.append((engine.frame, engine.clock, engine.currentGreen, st.uid[live], st.cls[live],
+                          st.lane[live], st.x[live], st.y[live]))
+
+    engine.observers.append(snapshot)
+    engine.run()
+    writer.close()
+
+    trace = TraceReader(path)
+    assert len(trace) == len(snapshots)
+    for k in sorted({0, 1, 63, 64, 65, 127, 128, len(snapshots) // 2, len(snapshots) - 1}):
+        frame, clock, green, uid, cls, lane, x, y = snapshots[k]
+        assert trace.index(clock) == k
+        tick, rows = trace.at(clock)
+        assert tick['frame'] == frame
+        assert tick['currentGreen'] == green
+        assert np.array_equal(rows['uid'], uid)
+        assert np.array_equal(rows['cls'], cls)
+        assert np.array_equal(rows['lane'], lane)
+        assert np.array_equal(rows['x'], x.astype(np.float32))
+        assert np.array_equal(rows['y'], y.astype(np.float32))
+
+
+def test_unclosed_trace_is_rejected(tmp_path):
+    path = str(tmp_path / 'open.trace')
+    writer = TraceWriter(path)
+    writer.file.close()
+    with pytest.raises(ValueError):
+        TraceReader(path)
@@ -0,0 +1,170 @@
+# trafficsim/arrivals.py
+# Seeded arrival schedules generated in vectorized chunks: Poisson or
+# platoon arrivals per approach and class, optionally shaped by a
+# time-of-day profile. The engine pops arrivals off the schedule as
+# SPAWN events, so they depend only on the seed, never on wall time.
+#
+# a spec is a plain dict (JSON friendly, so sweeps can vary it):
+#   kind            'poisson' (default) or 'platoon'
+#   rate            vehicles per second over all approaches (default 1 / spawnInterval)
+#   directionShare  share of the rate per approach (right, down, left, up)
+#   classWeights    arrival weights per class, as config.vehicleWeights
+#   rates           4 x 8 vehicles/s per approach and class; overrides the three above
+#   timeOfDay       [[hour, factor], ...] rate multiplier, linear in between, wraps at 24
+#   startHour       hour of day at simulated time 0
+#   platoonSize     mean vehicles per platoon ('platoon' only)
+#   platoonHeadway  seconds between vehicles of a platoon ('platoon' only)
+#   turnShare       share of lane 2 vehicles that turn
+#   chunk           simulated seconds generated at a time
+
+import numpy as np
+
+from . import config
+
+noOfClasses = len(config.vehicleTypes)
+BIKE = config.classIndex['bike']
+IS_EMERGENCY = np.array([config.vehicleTypes[i] in config.emergencyClasses for i in range(noOfClasses)])
+# lane of an emergency vehicle: picked at spawn time among the lanes that are not full
+LANE_ANY = -1
+
+ARRIVAL = np.dtype([
+    ('time', np.float64),
+    ('direction', np.int8),
+    ('lane', np.int8),
+    ('cls', np.int8),
+    ('willTurn', np.bool_),
+])
+
+DEFAULTS = dict(
+    kind='poisson',
+    rate=None,
+    directionShare=(0.4, 0.4, 0.1, 0.1),
+    classWeights=None,
+    rates=None,
+    timeOfDay=None,
+    startHour=0.,
+    platoonSize=4.,
+    platoonHeadway=1.5,
+    turnShare=0.2,
+    chunk=600.,
+)
+
+
+def rate_matrix(spec, spawnInterval=config.spawnInterval, vehicleWeights=config.vehicleWeights):
+    """Vehicles per second per (approach, class), as the old spawner's mix at its average rate."""
+    if spec['rates'] is not None:
+        return np.asarray(spec['rates'], np.float64).reshape(config.noOfSignals, noOfClasses)
+    rate = spec['rate'] if spec['rate'] is not None else 1. / spawnInterval
+    weights = np.asarray(spec['classWeights'] if spec['classWeights'] is not None else vehicleWeights, np.float64)
+    share = np.asarray(spec['directionShare'], np.float64)
+    # emergencies arrive on any approach with equal probability
+    shares = np.where(IS_EMERGENCY[:, None], 1. / config.noOfSignals, share / share.sum())
+    return rate * (weights / weights.sum())[None, :] * shares.T
+
+
+class ArrivalGenerator:
+    """
+    Produces the schedule one chunk of simulated time at a time. Chunk i
+    is drawn from its own generator seeded with (seed, i), so a schedule
+    is reproducible from the seed alone whatever pace it is consumed at.
+    Platoons that run past the end of a chunk are carried into the next.
+    """
+
+    def __init__(self, spec=None, seed=0, spawnInterval=config.spawnInterval,
+                 vehicleWeights=config.vehicleWeights, ambulanceDelay=config.ambulanceDelay):
+        unknown = set(spec or ()) - set(DEFAULTS)
+        if unknown:
+            raise ValueError('unknown arrival settings: {}'.format(', '.join(sorted(unknown))))
+        self.spec = dict(DEFAULTS, **(spec or {}))
+        if self.spec['kind'] not in ('poisson', 'platoon'):
+            raise ValueError('unknown arrival kind {!r}'.format(self.spec['kind']))
+        self.seed = seed
+        self.rates = rate_matrix(self.spec, spawnInterval, vehicleWeights)
+        self.ambulanceDelay = ambulanceDelay
+        self.index = 0
+        self.carry = np.zeros(0, ARRIVAL)
+
+    def factor(self, time):
+        """Time-of-day rate multiplier at simulated time(s) `time`."""
+        profile = self.spec['timeOfDay']
+        if not profile:
+            return np.ones_like(time, np.float64)
+        hours, factors = np.asarray(profile, np.float64).T
+        hour = (self.spec['startHour'] + np.asarray(time) / 3600.) % 24.
+        return np.interp(hour, hours, factors, period=24.)
+
+    def peak(self):
+        profile = self.spec['timeOfDay']
+        return max(f for _, f in profile) if profile else 1.
+
+    def peak_rate(self):
+        """Highest total arrivals per second at any time of day; 0 if the schedule is always empty."""
+        return float(self.rates.sum()) * max(self.peak(), 0.)
+
+    def covered(self):
+        """Simulated seconds the chunks generated so far span."""
+        return self.index * self.spec['chunk']
+
+    def _poisson(self, rng, start, length, rates):
+        counts = rng.poisson(rates * length)
+        cells = np.repeat(np.arange(rates.size), counts.ravel())
+        times = start + rng.random(len(cells)) * length
+        return times, cells // noOfClasses, cells % noOfClasses
+
+    def _platoons(self, rng, start, length, rates):
+        size, headway = self.spec['platoonSize'], self.spec['platoonHeadway']
+        approach = rates.sum(axis=1)
+        # platoon leaders per approach, then 1 + Poisson(size - 1) vehicles behind each
+        leaders = rng.poisson(approach / size * length)
+        directions = np.repeat(np.arange(config.noOfSignals), leaders)
+        starts = start + rng.random(len(directions)) * length
+        members = 1 + rng.poisson(size - 1, len(starts))
+        first = np.repeat(np.cumsum(members) - members, members)
+        position = np.arange(members.sum()) - first
+        times = np.repeat(starts, members) + position * headway * rng.uniform(0.8, 1.2, len(position))
+        directions = np.repeat(directions, members)
+        # classes from each approach's own mix
+        mix = np.cumsum(rates / np.maximum(approach, 1e-12)[:, None], axis=1)
+        classes = (rng.random(len(times))[:, None] > mix[directions]).sum(axis=1)
+        return times, directions, np.minimum(classes, noOfClasses - 1)
+
+    def chunk(self):
+        """The next chunk of arrivals, sorted by time."""
+        length = self.spec['chunk']
+        start = self.index * length
+        rng = np.random.default_rng([self.seed, self.index])
+        self.index += 1
+
+        # time of day: draw at the peak rate and thin down to the profile
+        peak = self.peak()
+        draw = self._platoons if self.spec['kind'] == 'platoon' else self._poisson
+        times, directions, classes = draw(rng, start, length, self.rates * peak)
+        keep = rng.random(len(times)) * peak < self.factor(times)
+        # emergencies are held back at the start of a run, as before
+        keep &= ~(IS_EMERGENCY[classes] & (times < self.ambulanceDelay))
+        times, directions, classes = times[keep], directions[keep], classes[keep]
+
+        rows = np.zeros(len(times), ARRIVAL)
+        rows['time'] = times
+        rows['direction'] = directions
+        rows['cls'] = classes
+        # bikes keep to lane 0, the rest use lanes 1 and 2; only lane 2 turns
+        # (an emergency vehicle's turn applies if it ends up in lane 2)
+        emergency = IS_EMERGENCY[classes]
+        lanes = np.where(classes == BIKE, 0, rng.integers(1, 3, len(times)))
+        rows['lane'] = np.where(emergency, LANE_ANY, lanes)
+        rows['willTurn'] = ((lanes == 2) | emergency) & (rng.random(len(times)) < self.spec['turnShare'])
+
+        rows = np.concatenate((self.carry, rows))
+        rows = rows[np.argsort(rows['time'], kind='stable')]
+        end = np.searchsorted(rows['time'], start + length)
+        self.carry = rows[end:]
+        return rows[:end]
+
+    def schedule(self, duration):
+        """Every arrival before simulated time `duration` in one array."""
+        rows = list()
+        while self.index * self.spec['chunk'] < duration:
+            rows.append(self.chunk())
+        rows = np.concatenate(rows) if rows else np.zeros(0, ARRIVAL)
+        return rows[rows['time'] < duration]
@@ -0,0 +1,85 @@
+# trafficsim/assets.py
+# Flyweight image registry for the pygame viewer: every PNG under images/
+# is decoded once and shared by all vehicles that use it.
+
+import os
+
+import pygame
+
+from . import config
+from .config import SCREEN_W, SCREEN_H
+
+
+def load_image(path, fallback_size=(40,20), alpha=True):
+    if os.path.exists(path):
+        img = pygame.image.load(path)
+        return img.convert_alpha() if alpha else img.convert()
+    else:
+        surf = pygame.Surface(fallback_size, pygame.SRCALPHA)
+        surf.fill((200,200,200,255))
+        return surf.convert_alpha()
+
+
+class AssetRegistry:
+    """
+    Loads the background, the signal lights and images/<direction>/<class>.png
+    (or the grey fallback surfaces) once, converted for fast blitting. The
+    surfaces are shared: callers must not draw on them.
+
+    pack() additionally copies every vehicle image into one atlas surface;
+    atlas_rect() then gives the source area to pass to Surface.blit.
+    Needs an initialised display (convert/convert_alpha).
+    """
+
+    def __init__(self, image_dir=config.IMAGE_DIR):
+        self.image_dir = image_dir
+        self.vehicles = dict()
+        self.signals = dict()
+        self.atlas = None
+        self.rects = dict()
+
+        bg_path = os.path.join(image_dir, 'mod_int.png')
+        if os.path.exists(bg_path):
+            self.background = pygame.image.load(bg_path).convert()
+        else:
+            self.background = pygame.Surface((SCREEN_W, SCREEN_H)).convert()
+            self.background.fill((180,180,180))
+
+        for colour in ('red', 'yellow', 'green'):
+            self.signals[colour] = load_image(os.path.join(image_dir, 'signals', colour + '.png'), (40,40))
+
+        for direction in config.directionNumbers.values():
+            for vehicleClass in config.vehicleTypes.values():
+                path = os.path.join(image_dir, direction, vehicleClass + '.png')
+                self.vehicles[direction, vehicleClass] = load_image(path, config.fallback_size(vehicleClass))
+
+    def vehicle(self, direction, vehicleClass):
+        return self.vehicles[direction, vehicleClass]
+
+    def signal(self, colour):
+        return self.signals[colour]
+
+    # ----------------------
+    # Texture atlas
+    # ----------------------
+    def pack(self, width=512):
+        """Shelf-pack all vehicle images into a single surface."""
+        order = sorted(self.vehicles, key=lambda k: -self.vehicles[k].get_height())
+        x = y = shelf = 0
+        for key in order:
+            w, h = self.vehicles[key].get_size()
+            if x + w > width:
+                x, y, shelf = 0, y + shelf, 0
+            self.rects[key] = pygame.Rect(x, y, w, h)
+            x += w
+            shelf = max(shelf, h)
+
+        self.atlas = pygame.Surface((width, y + shelf), pygame.SRCALPHA).convert_alpha()
+        self.atlas.fill((0,0,0,0))
+        for key, rect in self.rects.items():
+            # RGBA_MAX onto a cleared surface copies the pixels and alpha verbatim
+            self.atlas.blit(self.vehicles[key], rect, special_flags=pygame.BLEND_RGBA_MAX)
+        return self.atlas
+
+    def atlas_rect(self, direction, vehicleClass):
+        return self.rects[direction, vehicleClass]
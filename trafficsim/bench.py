@@ -0,0 +1,208 @@
+# trafficsim/bench.py
+# Scaling benchmark of the headless engine: seed the intersection with N
+# vehicles per lane and measure how fast its parts run.
+#
+# usage:
+#   python -m trafficsim.bench --out bench.json
+#   python -m trafficsim.bench --sizes 10,100 --render --out bench.json
+#   python -m trafficsim.bench --compare baseline.json bench.json --threshold 0.1
+#
+# every size runs in a fresh process so its peak RSS is its own. --compare
+# exits with status 1 when any metric regressed by more than the threshold,
+# for use in a nightly job. Rendering (--render) uses the SDL dummy video
+# driver, so no display is needed.
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+from . import config
+from .config import directionNumbers, vehicle_size
+
+SIZES = (10, 100, 1000, 10000)
+# one vehicle in this many is an emergency vehicle, cycling through the emergency classes;
+# shorter lanes still get one each, so every size exercises preemption
+EMERGENCY_EVERY = 100
+ORDINARY = ('car', 'bus', 'truck', 'rickshaw', 'bike')
+
+# metric -> True when higher is better
+METRICS = {
+    'vehicles': None,          # informational
+    'seed_s': False,           # seconds to spawn every vehicle
+    'move_tps': True,          # move() calls per second
+    'controller_tps': True,    # controller iterations (SIGNAL events, one per simulated second) per second
+    'detect_tps': True,        # detect_emergency() calls per second
+    'step_tps': True,          # full engine frames (every event) per second
+    'setTime_us': False,       # microseconds per setTime()
+    'detect_emergency_us': False,
+    'peak_rss_mb': False,
+    'render_fps': True,        # viewer draw + present per second (--render only)
+}
+
+
+def populate(engine, n):
+    """Queue n vehicles in every lane, nose to tail from the lane entry backwards."""
+    every = min(EMERGENCY_EVERY, n)
+    for d in range(config.noOfSignals):
+        direction = directionNumbers[d]
+        forward = direction in ('right', 'down')
+        for lane in range(3):
+            x, y = config.x[direction][lane], config.y[direction][lane]
+            offset = 0.
+            for k in range(n):
+                if k % every == every // 2:
+                    cls = config.emergencyClasses[(k // every + d + lane) % len(config.emergencyClasses)]
+                else:
+                    cls = ORDINARY[k % len(ORDINARY)]
+                if direction in ('right', 'left'):
+                    engine.add_vehicle(lane, cls, d, x=x - offset if forward else x + offset, y=y)
+                    offset += vehicle_size(direction, cls)[0] + engine.gap
+                else:
+                    engine.add_vehicle(lane, cls, d, x=x, y=y - offset if forward else y + offset)
+                    offset += vehicle_size(direction, cls)[1] + engine.gap
+
+
+def rate(fn, min_time=0.25, min_calls=3):
+    """Calls of fn per second, timed over at least min_time seconds and min_calls calls."""
+    calls, start = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if calls >= min_calls and elapsed >= min_time:
+            return calls / elapsed
+
+
+def measure(n, min_time=0.25, render=False):
+    """Worker: every metric for n vehicles per lane."""
+    from .engine import SimulationEngine
+    from .profiler import FrameProfiler, ENGINE_SECTIONS
+    result = dict()
+    # movement with every light red, so the queues stay put however long it runs
+    engine = SimulationEngine(seed=0, spawn=False, controller=False, capacity=12 * n + 16)
+    start = time.perf_counter()
+    populate(engine, n)
+    result['seed_s'] = time.perf_counter() - start
+    result['vehicles'] = engine.state.live()
+    result['move_tps'] = rate(engine.move, min_time)
+
+    # the full event loop with the controller, one simulated second per call; the
+    # profiler charges every SIGNAL event (one controller iteration) to 'controller'
+    engine = SimulationEngine(seed=0, spawn=False, capacity=12 * n + 16, simTime=10 ** 9)
+    populate(engine, n)
+    result['detect_tps'] = rate(engine.detect_emergency, min_time)
+    result['detect_emergency_us'] = 1e6 / result['detect_tps']
+    result['setTime_us'] = 1e6 / rate(engine.setTime, min_time)
+    profiler = engine.profiler = FrameProfiler(ENGINE_SECTIONS + ('frame',))
+    def second():
+        profiler.begin()
+        engine.step(1.)
+        profiler.end()
+    start = time.perf_counter()
+    rate(second, min_time)
+    wall = time.perf_counter() - start
+    controller = profiler.data[:profiler.frames, profiler.column['controller']].sum() / 1000.
+    result['controller_tps'] = engine.timeElapsed / controller if controller else 0.
+    result['step_tps'] = engine.frame / wall
+    engine.profiler = None
+
+    if render:
+        import pygame
+        from .viewer import Viewer
+        viewer = Viewer(engine)
+        def frame():
+            pygame.event.pump()
+            viewer.draw()
+            viewer.present()
+        result['render_fps'] = rate(frame, min_time)
+        pygame.quit()
+
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = rss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+    return result
+
+
+def run(sizes=SIZES, min_time=0.25, render=False, log=sys.stderr):
+    report = dict(
+        meta=dict(python=platform.python_version(), numpy=np.__version__, platform=platform.platform(),
+                  machine=platform.machine(), time=time.strftime('%Y-%m-%dT%H:%M:%S'), min_time=min_time),
+        results=dict(),
+    )
+    for n in sizes:
+        # a fresh interpreter per size: peak RSS must not carry over
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            report['results'][str(n)] = result = pool.submit(measure, n, min_time, render).result()
+        print('N={:>6}: {:>7} vehicles, move {:9.1f}/s, step {:9.1f}/s, detect {:7.2f} us, '
+              'setTime {:7.2f} us, {:7.1f} MB'.format(
+                  n, result['vehicles'], result['move_tps'], result['step_tps'],
+                  result['detect_emergency_us'], result['setTime_us'], result['peak_rss_mb']), file=log)
+    return report
+
+
+def compare(base, new, threshold=0.1):
+    """
+    Rows (size, metric, base, new, relative change, regressed) for every
+    metric present in both reports. A change counts as a regression when
+    it is worse than base by more than threshold (0.1 = 10%).
+    """
+    rows = list()
+    for size, before in base['results'].items():
+        after = new['results'].get(size)
+        if after is None:
+            continue
+        for metric, higher in METRICS.items():
+            if higher is None or metric not in before or metric not in after:
+                continue
+            old, value = before[metric], after[metric]
+            change = (value - old) / old if old else 0.
+            worse = -change if higher else change
+            rows.append((size, metric, old, value, change, worse > threshold))
+    return rows
+
+
+# ----------------------
+# CLI
+# ----------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scaling benchmark of the simulation engine')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='vehicles per lane, comma separated')
+    parser.add_argument('--min-time', type=float, default=0.25, help='seconds each metric is timed for')
+    parser.add_argument('--render', action='store_true', help='also time the pygame viewer (SDL dummy driver)')
+    parser.add_argument('--out', default='bench.json', help='JSON report to write')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='diff two reports instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        reports = list()
+        for path in args.compare:
+            with open(path) as f:
+                reports.append(json.load(f))
+        rows = compare(*reports, threshold=args.threshold)
+        for size, metric, old, value, change, regressed in rows:
+            print('{:>6} {:>20} {:12.3f} -> {:12.3f} {:+7.1%}{}'.format(
+                size, metric, old, value, change, '  REGRESSION' if regressed else ''))
+        regressions = sum(row[-1] for row in rows)
+        print('{} regression(s) beyond {:.0%}'.format(regressions, args.threshold))
+        sys.exit(1 if regressions else 0)
+
+    report = run([int(n) for n in args.sizes.split(',')], args.min_time, args.render)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('report -> {}'.format(args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# trafficsim/config.py
+# Intersection geometry and signal timing defaults shared by the engine and the viewer.
+# Pure Python on purpose: nothing here may import pygame.
+
+import os
+import struct
+
+# ----------------------
+# CONFIG / DEFAULTS
+# ----------------------
+defaultRed = 150
+defaultYellow = 5
+defaultGreen = 20
+defaultMinimum = 10
+defaultMaximum = 60
+
+noOfSignals = 4
+simTime = 400
+
+speeds = {
+    'car': 4.5,
+    'bus': 4.5,
+    'truck': 4.5,
+    'rickshaw': 4.5,
+    'bike': 4.5,
+    'ambulance': 4.5,
+    'firetruck': 4.5,
+    'vip': 4.5
+}
+
+# vehicle kinematics: 'constant' (full speed or standing still) or 'idm'
+kinematics = 'constant'
+# Intelligent Driver Model parameters per class for kinematics='idm':
+# (max acceleration px/s^2, comfortable deceleration px/s^2, time headway s);
+# the desired speed is speeds[cls] and the minimum gap is gap. They are
+# scaled to the canvas, not to real vehicles: the signal timings below were
+# set for 'constant' kinematics, so a queue has to discharge nearly as fast
+# as it does there or it grows without bound
+idmParameters = {
+    'car': (576, 405, 0.1),
+    'bus': (288, 270, 0.15),
+    'truck': (256, 270, 0.15),
+    'rickshaw': (432, 330, 0.1),
+    'bike': (720, 480, 0.08),
+    'ambulance': (640, 405, 0.08),
+    'firetruck': (360, 330, 0.1),
+    'vip': (640, 405, 0.1),
+}
+
+carTime = 2
+busTime = 3
+truckTime = 3
+rickshawTime = 1
+bikeTime = 1
+ambulanceTime = 1
+
+noOfLanes = 2
+detectionTime = 5
+
+# frames per simulated second; vehicle speeds are expressed in pixels per frame
+fps = 30
+# seconds between two spawns of generateVehicles
+spawnInterval = 0.7
+# emergency vehicles are held back for the first seconds of a run
+ambulanceDelay = 30
+# arrival schedule spec (see trafficsim/arrivals.py); None keeps the fixed-rate spawner
+arrivals = None
+# arrival weights of generateVehicles: car, bus, truck, rickshaw, bike, ambulance, firetruck, vip
+vehicleWeights = (25, 15, 15, 15, 20, 3, 2, 1)
+# weights of the first five classes while emergencies are held back
+earlyWeights = (25, 15, 15, 15, 30)
+
+x = {'right':[0,0,0], 'down':[755,727,697], 'left':[1400,1400,1400], 'up':[602,627,657]}
+y = {'right':[348,370,398], 'down':[0,0,0], 'left':[498,466,436], 'up':[800,800,800]}
+
+# mapping of numeric types to string names
+vehicleTypes = {0:'car', 1:'bus', 2:'truck', 3:'rickshaw', 4:'bike', 5:'ambulance', 6:'firetruck', 7:'vip'}
+directionNumbers = {0:'right', 1:'down', 2:'left', 3:'up'}
+directionIndex = {name: i for i, name in directionNumbers.items()}
+classIndex = {name: i for i, name in vehicleTypes.items()}
+emergencyClasses = ('ambulance', 'firetruck', 'vip')
+
+signalCoods = [(530,230),(810,230),(810,570),(530,570)]
+signalTimerCoods = [(530,210),(810,210),(810,550),(530,550)]
+vehicleCountCoods = [(480,210),(880,210),(880,550),(480,550)]
+
+stopLines = {'right': 590, 'down': 330, 'left': 800, 'up': 535}
+defaultStop = {'right': 580, 'down': 320, 'left': 810, 'up': 545}
+# intersection box between the four stop lines: (left, top, right, bottom)
+conflictZone = (stopLines['right'], stopLines['down'], stopLines['left'], stopLines['up'])
+
+gap = 15
+# degrees added per frame while a vehicle turns
+rotationAngle = 3
+
+SCREEN_W, SCREEN_H = 1400, 800
+
+# ----------------------
+# Asset geometry
+# ----------------------
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'images')
+
+def fallback_size(vehicleClass):
+    """Size of the placeholder sprite used when a vehicle image is missing."""
+    if vehicleClass in ('bus','truck'): return (80,40)
+    if vehicleClass == 'bike': return (24,12)
+    if vehicleClass in emergencyClasses: return (48,24)
+    return (40,20)
+
+_sizes = dict()
+def vehicle_size(direction, vehicleClass):
+    """
+    (width, height) of images/<direction>/<vehicleClass>.png, read from
+    the PNG header so the headless engine never has to decode pixels.
+    """
+    key = (direction, vehicleClass)
+    if key not in _sizes:
+        path = os.path.join(IMAGE_DIR, direction, vehicleClass + '.png')
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(24)
+            _sizes[key] = struct.unpack('>II', head[16:24])
+        except (IOError, struct.error):
+            _sizes[key] = fallback_size(vehicleClass)
+    return _sizes[key]
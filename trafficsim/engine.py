@@ -0,0 +1,718 @@
+# trafficsim/engine.py
+# Headless, discrete-event version of the adaptive signal simulation.
+# Owns vehicles, signals and the controller state; the pygame window in
+# trafficsim/viewer.py is only an optional consumer of this object.
+
+import inspect
+import math
+import random
+from collections import namedtuple
+from time import perf_counter
+
+import numpy as np
+
+from . import config
+from .config import directionNumbers, emergencyClasses, stopLines, defaultStop, vehicle_size, SCREEN_W, SCREEN_H
+from .state import VehicleState, Vehicle
+from .lanes import new_lanes
+from .counters import CounterIndex
+from .priority import EmergencyIndex
+from .events import EventQueue, SECOND, SIGNAL, SPAWN, EMERGENCY, DETECTION, FRAME
+from .snapshot import SnapshotPublisher
+from .kpi import KpiCollector
+from .spatial import SpatialGrid
+from .arrivals import ArrivalGenerator, LANE_ANY
+
+# events closer than this to a step boundary count as being on it
+EPS = 1e-9
+
+# tunables that can be overridden per engine (see SimulationEngine.__init__)
+PARAMETERS = (
+    'defaultRed', 'defaultYellow', 'defaultGreen', 'defaultMinimum', 'defaultMaximum',
+    'simTime', 'carTime', 'busTime', 'truckTime', 'rickshawTime', 'bikeTime',
+    'noOfLanes', 'detectionTime', 'fps', 'spawnInterval', 'ambulanceDelay', 'gap',
+    'vehicleWeights', 'earlyWeights', 'kinematics', 'idmParameters', 'arrivals',
+)
+
+# per-direction lookup tables, indexed by direction code (right, down, left, up)
+_directions = [directionNumbers[i] for i in range(4)]
+FORWARD = np.array([d in ('right', 'down') for d in _directions])  # coordinate grows while driving
+ALONG_Y = np.array([d in ('down', 'up') for d in _directions])     # drives along the y axis
+STOP_LINE = np.array([stopLines[d] for d in _directions], np.float64)
+DEFAULT_STOP = np.array([defaultStop[d] for d in _directions], np.float64)
+TURN_DX = np.array([2., -2., -2., 2.])
+TURN_DY = np.array([2., 2., -2., -2.])
+# a vehicle is off the canvas once its rear passes this coordinate (compared against pos, or pos + size going backwards)
+EXIT_AT = np.array([SCREEN_W if FORWARD[i] and not ALONG_Y[i] else SCREEN_H if FORWARD[i] else 0.
+                    for i in range(4)])
+IS_EMERGENCY = np.array([config.vehicleTypes[i] in emergencyClasses for i in range(len(config.vehicleTypes))])
+# currentGreen of an engine without a signal controller: every light is red
+ALL_RED = -1
+# below this many pixels per frame an IDM vehicle counts as halted
+HALT_SPEED = 0.05
+# profiler section charged with each event kind
+PROFILED = {FRAME: 'move', SIGNAL: 'controller', SPAWN: 'spawner',
+            SECOND: 'timers', EMERGENCY: 'timers', DETECTION: 'timers'}
+
+# what move() reads every frame, see SimulationEngine._columns()
+Layout = namedtuple('Layout', (
+    'direction', 'forward', 'alongY', 'defaultStop', 'stopLine', 'exitAt', 'emergency', 'alive', 'pending',
+    'red', 'x', 'y', 'width', 'height', 'crossed', 'leader', 'origin', 'cls', 'speed', 'velocity',
+    'stop', 'waited', 'stops', 'halted', 'accel', 'decel', 'headway', 'rootAB',
+))
+
+def rotated_size(width, height, angle):
+    """Bounding box of a width x height sprite rotated by angle degrees (matches pygame.transform.rotate)."""
+    r = np.radians(angle)
+    c, s = np.abs(np.cos(r)), np.abs(np.sin(r))
+    return np.floor(width * c + height * s + 1e-6), np.floor(width * s + height * c + 1e-6)
+
+
+# ----------------------
+# TrafficSignal
+# ----------------------
+class TrafficSignal:
+    def __init__(self, red, yellow, green, minimum, maximum):
+        self.red = red
+        self.yellow = yellow
+        self.green = green
+        self.minimum = minimum
+        self.maximum = maximum
+        self.signalText = "30"
+        self.totalGreenTime = 0
+
+# ----------------------
+# ENGINE
+# ----------------------
+class SimulationEngine:
+    """
+    Pure-Python, discrete-event simulation core. Everything that happens
+    is an event on a virtual clock (see trafficsim/events.py): vehicles
+    move once per frame (1/fps seconds), the signal controller counts
+    down once per simulated second, the spawner fires every spawnInterval
+    seconds and an arriving emergency vehicle can preempt the signals at
+    once. Call step(dt) or run_until(t) to process events; a run is as
+    fast as the CPU allows and is fully determined by its seed.
+
+    Any name in PARAMETERS can be overridden through keyword arguments,
+    e.g. SimulationEngine(seed=1, defaultMinimum=8, simTime=3600).
+
+    kinematics='idm' replaces constant-speed movement with the Intelligent
+    Driver Model: every vehicle accelerates towards its desired speed and
+    brakes for its lane leader and, on red or yellow, for the stop line,
+    with per-class parameters from idmParameters.
+
+    A new green holds its approach at the stop line until no vehicle
+    from another approach is left inside the intersection box
+    (config.conflictZone), looked up in the spatial grid; emergency
+    vehicles go at once.
+
+    controller=False never runs the signal controller and keeps every
+    light red (currentGreen is ALL_RED), so queues stand still at their
+    stop lines however long the engine runs.
+
+    debug=True cross-checks the incremental counters and the emergency
+    index against a full scan of the vehicle state after every frame.
+    """
+
+    def __init__(self, seed=None, spawn=True, controller=True, capacity=1024, debug=False, **params):
+        for name in PARAMETERS:
+            setattr(self, name, params.pop(name, getattr(config, name)))
+        if params:
+            raise TypeError('unknown simulation parameters: {}'.format(', '.join(sorted(params))))
+
+        self.random = random.Random(seed)
+        self.spawn = spawn
+        self.controller = controller
+        self.debug = debug
+        self.tick = 1. / self.fps
+        if self.kinematics not in ('constant', 'idm'):
+            raise ValueError('unknown kinematics {!r}'.format(self.kinematics))
+        # per-class IDM parameters in pixels and frames
+        idm = np.array([self.idmParameters[config.vehicleTypes[i]] for i in range(len(config.vehicleTypes))], np.float64)
+        self._accel = idm[:, 0] / self.fps ** 2
+        self._decel = idm[:, 1] / self.fps ** 2
+        self._headway = idm[:, 2] * self.fps
+
+        self.state = VehicleState(capacity)
+        # slot -> Vehicle handle; handles are pooled together with their slots
+        self.handles = list()
+        # vehicles[direction][lane] is a LaneQueue, front to back
+        self.vehicles = new_lanes(self.state, self.handles)
+        self.retired = 0
+        self.spawned = 0
+        # running sums for summary(), taken at crossing time so they survive despawn
+        self.totals = dict(wait=0, emergencies=0, clearance=0.)
+        self.counters = CounterIndex()
+        self.emergencies = EmergencyIndex(self.state, self.fps)
+        self.kpis = KpiCollector()
+        # brought up to date on first use after vehicles moved
+        self.grid = SpatialGrid()
+        self._gridStale = True
+        # approach whose green has found the intersection box clear, see move()
+        self._cleared = None if controller else ALL_RED
+
+        self.currentGreen = 0 if controller else ALL_RED
+        self.nextGreen = (self.currentGreen + 1) % config.noOfSignals
+        self.currentYellow = 0
+        self.timeElapsed = 0
+        self.frame = 0
+
+        self.signals = list()
+        self.initialize_signals()
+        # per-frame column views of move(), see _columns()
+        self._layout = None
+        # callables run with the engine after every frame (trace recorders, metrics)
+        self.observers = list()
+        # a profiler.FrameProfiler charged with the time spent per event kind
+        self.profiler = None
+
+        self._target = 0.
+        self._controller = self._controllerLoop()
+        self.events = EventQueue()
+        self.events.schedule(0., FRAME)
+        if controller:
+            self.events.schedule(0., SIGNAL)
+        self.events.schedule(1., SECOND)
+        # with an arrivals spec vehicles come from a precomputed, seeded schedule
+        self.schedule = None
+        if self.spawn and self.arrivals is not None:
+            self.schedule = ArrivalGenerator(self.arrivals, self.random.getrandbits(63), self.spawnInterval,
+                                             self.vehicleWeights, self.ambulanceDelay)
+            self._arrivals, self._nextArrival = self.schedule.chunk(), 0
+            self._schedule_arrival()
+        elif self.spawn:
+            self.events.schedule(0., SPAWN, 0)
+        # latest consistent Frame for readers on other threads
+        self.snapshots = SnapshotPublisher()
+        self.snapshots.publish(self)
+
+    @property
+    def clock(self):
+        """Simulated seconds since the start of the run."""
+        return self.events.now
+
+    @property
+    def simulation(self):
+        """Vehicles currently on the canvas (the old sprite group), in slot order."""
+        return [self.handles[slot] for slot in np.flatnonzero(self.state.view('alive'))]
+
+    @property
+    def finished(self):
+        return self.timeElapsed >= self.simTime
+
+    def total_crossed(self):
+        return self.counters.crossed_total()
+
+    def summary(self):
+        """
+        Run-level KPIs: vehicles crossed per hour, mean seconds a crossed
+        vehicle spent stopped before its stop line, and mean seconds from
+        spawn to crossing for emergency vehicles. p95_wait, p95_delay and
+        max_queue come from the rolling KPI windows (see kpi.py).
+        """
+        crossed, totals = self.total_crossed(), self.totals
+        hours = self.clock / 3600.
+        return {
+            'crossed': crossed,
+            'throughput': crossed / hours if hours else 0.,
+            'mean_wait': totals['wait'] / self.fps / crossed if crossed else 0.,
+            'emergencies': totals['emergencies'],
+            'emergency_clearance': totals['clearance'] / totals['emergencies'] if totals['emergencies'] else 0.,
+            'p95_wait': self.kpis.percentile('wait', 95),
+            'p95_delay': self.kpis.percentile('delay', 95),
+            'max_queue': self.kpis.max_queue(),
+        }
+
+    # ----------------------
+    # Stepping
+    # ----------------------
+    def step(self, dt=None):
+        """Advance the simulation by dt seconds (one frame by default)."""
+        self.run_until(self._target + (self.tick if dt is None else dt))
+
+    def run(self, duration=None):
+        """Run headless for duration seconds, or until simTime is reached."""
+        self.run_until(self._target + duration if duration is not None else float('inf'))
+        return self.total_crossed()
+
+    def run_until(self, time):
+        """Process every event scheduled before simulated time `time`, then publish a snapshot."""
+        self._target = max(self._target, time)
+        events, profiler = self.events, self.profiler
+        while not self.finished:
+            t = events.peek()
+            if t is None or t > time - EPS:
+                break
+            if profiler is None:
+                self._dispatch(*events.pop())
+                continue
+            start = perf_counter()
+            event = events.pop()
+            self._dispatch(*event)
+            profiler.add(PROFILED[event[1]], perf_counter() - start)
+        if profiler is None:
+            self.snapshots.publish(self)
+        else:
+            start = perf_counter()
+            self.snapshots.publish(self)
+            profiler.add('snapshot', perf_counter() - start)
+
+    def _dispatch(self, time, kind, data):
+        if kind == FRAME:
+            self.move()
+            if self.debug:
+                self.counters.verify(self.state)
+                self.emergencies.verify()
+                self.spatial().verify(self.state, config.conflictZone)
+            for observer in self.observers:
+                observer(self)
+            self.frame += 1
+            # frame times are computed, not accumulated, so they never drift
+            self.events.schedule(self.frame / self.fps, FRAME)
+        elif kind == SECOND:
+            self.timeElapsed += 1
+            self.kpis.queue(time, self.state)
+            self.events.schedule(time + 1, SECOND)
+        elif kind == SIGNAL:
+            next(self._controller)
+            self.events.schedule(time + 1, SIGNAL)
+        elif kind == SPAWN:
+            if self.schedule is not None:
+                self.arrive(self._arrivals[data])
+                self._schedule_arrival()
+            else:
+                self.generate_vehicle()
+                self.events.schedule((data + 1) * self.spawnInterval, SPAWN, data + 1)
+        elif kind == EMERGENCY:
+            if inspect.getgeneratorstate(self._controller) == inspect.GEN_SUSPENDED:
+                self._controller.send(EMERGENCY)
+        elif kind == DETECTION:
+            self.setTime()
+
+    # ----------------------
+    # Vehicles
+    # ----------------------
+    def add_vehicle(self, lane, vehicleClass, direction_number, will_turn=0, x=None, y=None):
+        """Spawn a vehicle at the lane entry point, or at (x, y) when given."""
+        direction = directionNumbers[direction_number]
+        width, height = vehicle_size(direction, vehicleClass)
+        x = config.x[direction][lane] if x is None else x
+        y = config.y[direction][lane] if y is None else y
+        speed = config.speeds[vehicleClass]
+        # free-flow time to the stop line, the baseline of the delay KPI
+        if ALONG_Y[direction_number]:
+            pos, size = y, height
+        else:
+            pos, size = x, width
+        if FORWARD[direction_number]:
+            distance = stopLines[direction] - pos - size
+        else:
+            distance = pos - stopLines[direction]
+        slot = self.state.add(
+            x=x, y=y, width=width, height=height, baseWidth=width, baseHeight=height,
+            speed=speed, velocity=speed, stop=defaultStop[direction],
+            lane=lane, direction=direction_number, origin=direction_number,
+            cls=config.classIndex[vehicleClass], willTurn=will_turn, spawnTime=self.clock,
+            freeTime=max(distance, 0.) / speed / self.fps, uid=self.spawned,
+        )
+        self.spawned += 1
+        self._layout = None
+        if slot == len(self.handles):
+            self.handles.append(Vehicle(self.state, slot))
+        v = self.handles[slot]
+        self.vehicles[direction][lane].append(slot)
+        self.counters.spawn(direction_number, config.classIndex[vehicleClass])
+        if vehicleClass in emergencyClasses:
+            self.emergencies.spawn(slot, config.classIndex[vehicleClass], direction_number, lane)
+            self.events.schedule(self.clock, EMERGENCY, slot)
+        return v
+
+    def _emergency_lane(self, direction_number):
+        """A random lane of the approach that is not yet full, any lane if all are."""
+        dname = directionNumbers[direction_number]
+        available_lanes = [l for l in range(3) if len(self.vehicles[dname][l]) < 6]
+        return self.random.choice(available_lanes) if available_lanes else self.random.randint(0,2)
+
+    def generate_vehicle(self):
+        """One iteration of the old generateVehicles thread."""
+        rng = self.random
+        # weights: car, bus, truck, rickshaw, bike, ambulance, firetruck, vip
+        if self.clock < self.ambulanceDelay:
+            vehicle_type = rng.choices([0,1,2,3,4],self.earlyWeights,k=1)[0]
+        else:
+            vehicle_type = rng.choices([0,1,2,3,4,5,6,7],self.vehicleWeights,k=1)[0]
+
+        if vehicle_type == 4:  # bike - prefer lane 0
+            lane_number = 0
+            temp = rng.randint(0,999)
+            direction_number = 0 if temp < 400 else 1 if temp < 800 else 2 if temp < 900 else 3
+        elif vehicle_type in (5,6,7):  # emergencies go to any lane that is not yet full
+            direction_number = rng.randint(0,3)
+            lane_number = self._emergency_lane(direction_number)
+        else:
+            lane_number = rng.randint(1,2)
+            temp = rng.randint(0,999)
+            direction_number = 0 if temp < 400 else 1 if temp < 800 else 2 if temp < 900 else 3
+
+        # only lane 2 vehicles may turn (~20% chance)
+        will_turn = 1 if lane_number == 2 and rng.randint(0,9) <= 1 else 0
+        return self.add_vehicle(lane_number, config.vehicleTypes[vehicle_type], direction_number, will_turn)
+
+    def _schedule_arrival(self):
+        # next row of the schedule as a SPAWN event, generating chunks as they run out;
+        # nothing more is scheduled once no arrival can come before simTime
+        while self._nextArrival == len(self._arrivals):
+            if self.schedule.peak_rate() <= 0 or self.schedule.covered() >= self.simTime:
+                return
+            self._arrivals, self._nextArrival = self.schedule.chunk(), 0
+        self.events.schedule(float(self._arrivals['time'][self._nextArrival]), SPAWN, self._nextArrival)
+        self._nextArrival += 1
+
+    def arrive(self, row):
+        """Spawn one scheduled arrival (an arrivals.ARRIVAL record)."""
+        direction_number, lane = int(row['direction']), int(row['lane'])
+        if lane == LANE_ANY:
+            lane = self._emergency_lane(direction_number)
+        will_turn = 1 if lane == 2 and row['willTurn'] else 0
+        return self.add_vehicle(lane, config.vehicleTypes[int(row['cls'])], direction_number, will_turn)
+
+    def _columns(self):
+        """
+        Column views and per-slot lookups move() needs every frame. They
+        only change when a vehicle spawns, turns or retires (or the
+        columns grow on a spawn), so they are built once per change
+        instead of once per frame.
+        """
+        st = self.state
+        d, cls, alive = st.view('direction'), st.view('cls'), st.view('alive')
+        accel, decel = self._accel[cls], self._decel[cls]
+        self._layout = Layout(
+            direction=d, forward=FORWARD[d], alongY=ALONG_Y[d], defaultStop=DEFAULT_STOP[d],
+            stopLine=STOP_LINE[d], exitAt=EXIT_AT[d], emergency=IS_EMERGENCY[cls], alive=alive,
+            # vehicles that will start turning once they cross
+            pending=st.view('willTurn') & ~st.view('turned') & alive, red=np.zeros(st.n, bool),
+            x=st.view('x'), y=st.view('y'), width=st.view('width'), height=st.view('height'),
+            crossed=st.view('crossed'), leader=st.view('leader'), origin=st.view('origin'), cls=cls,
+            speed=st.view('speed'), velocity=st.view('velocity'), stop=st.view('stop'), waited=st.view('waited'),
+            stops=st.view('stops'), halted=st.view('halted'),
+            accel=accel, decel=decel, headway=self._headway[cls], rootAB=2 * np.sqrt(accel * decel),
+        )
+        return self._layout
+
+    def move(self):
+        """One frame of movement for every vehicle, as array operations."""
+        st = self.state
+        if st.n == 0:
+            return
+        c = self._layout or self._columns()
+        d, fwd, along_y, crossed, alive = c.direction, c.forward, c.alongY, c.crossed, c.alive
+        x, y = c.x, c.y
+        pos = np.where(along_y, y, x)
+        size = np.where(along_y, c.height, c.width)
+
+        # --- Determine front vehicle to maintain gap ---
+        has_leader = c.leader >= 0
+        lead = np.where(has_leader, c.leader, 0)
+        follow = has_leader & ~crossed[lead]
+        lpos, lsize = pos[lead], size[lead]
+        stop = np.where(fwd, lpos + lsize - size - self.gap, lpos + size + self.gap)
+        stop = np.where(follow, stop, c.defaultStop)
+        c.stop[:] = stop
+
+        green = c.origin == self.currentGreen if self.currentYellow == 0 else c.red
+        if self.currentYellow == 0 and self._cleared != self.currentGreen:
+            # a new green holds its approach at the stop line until the vehicles of the
+            # other approaches have left the box; an emergency vehicle goes at once
+            # unless a held vehicle is in front of it
+            if self.box_clear(self.currentGreen):
+                self._cleared = self.currentGreen
+            else:
+                held = green & c.emergency
+                released = held & ~follow
+                while True:
+                    more = released | (held & released[lead])
+                    if (more == released).all():
+                        break
+                    released = more
+                green = released
+
+        # -----------------------
+        # Straight movement logic
+        # -----------------------
+        front = np.where(fwd, pos + size, pos)
+        newly = np.where(fwd, front > c.stopLine, front < c.stopLine)
+        newly &= alive
+        newly &= ~crossed
+        if newly.any():
+            crossed |= newly
+            st.crossTime[:st.n][newly] = self.clock
+            self.counters.cross(d[newly], c.cls[newly])
+            waited = c.waited[newly]
+            self.totals['wait'] += int(waited.sum())
+            clear = self.clock - st.view('spawnTime')[newly]
+            self.kpis.cross(self.clock, d[newly], c.cls[newly], waited / self.fps, c.stops[newly], clear,
+                            np.maximum(clear - st.view('freeTime')[newly], 0.))
+            for slot in np.flatnonzero(newly & c.emergency):
+                self.emergencies.remove(slot)
+                self.totals['emergencies'] += 1
+                self.totals['clearance'] += self.clock - float(st.spawnTime[slot])
+            for i in range(config.noOfSignals):
+                self.vehicles[directionNumbers[i]]['crossed'] = int(self.counters.crossed[i])
+        if self.kinematics == 'idm':
+            advance, halted = self._idm(c, pos, size, front, green, has_leader, lead)
+        else:
+            # emergency vehicles (ambulance/firetruck/vip) can pass when their lane is green
+            effective_stop = np.where(c.emergency & green, -1000., stop)
+            moving = np.where(fwd, front <= effective_stop, pos >= effective_stop)
+            moving |= crossed
+            moving |= green
+            halted = ~moving
+            advance = np.where(moving, c.speed, 0.)
+            c.velocity[:] = advance
+        c.waited[:] += halted
+        c.stops[:] += halted & ~c.halted
+        c.halted[:] = halted
+        pos = np.where(fwd, pos + advance, pos - advance)
+        np.copyto(x, pos, where=~along_y)
+        np.copyto(y, pos, where=along_y)
+        self._gridStale = True
+
+        # -------------------------------
+        # Off-screen culling
+        # -------------------------------
+        gone = np.where(fwd, pos > c.exitAt, pos + size < c.exitAt)
+        gone &= crossed
+        gone &= alive
+        for slot in np.flatnonzero(gone):
+            self.retire(int(slot))
+
+        # -------------------------------
+        # Turning logic for smooth turns
+        # -------------------------------
+        turning = c.pending & crossed
+        if not turning.any():
+            return
+        idx = np.flatnonzero(turning)
+        td = d[idx]
+        angle = st.angle[idx] + config.rotationAngle
+        st.angle[idx] = angle
+        st.width[idx], st.height[idx] = rotated_size(st.baseWidth[idx], st.baseHeight[idx], angle)
+        x[idx] += TURN_DX[td]
+        y[idx] += TURN_DY[td]
+        for slot in idx[angle >= 90]:
+            self._finish_turn(self.handles[slot])
+
+    def _idm(self, c, pos, size, front, green, has_leader, lead):
+        """
+        One Intelligent Driver Model step for every vehicle at once.
+        Obstacles are the lane leader and, for a vehicle that has not
+        crossed on red or yellow, its stop position - unless it can no
+        longer stop there comfortably, in which case it drives on.
+        Returns (pixels to advance, halted mask) and updates velocity.
+        """
+        fwd, crossed = c.forward, c.crossed
+        a, b, T, root_ab = c.accel, c.decel, c.headway, c.rootAB
+        v, v0, s0 = c.velocity, c.speed, self.gap
+
+        def acceleration(gap, dv):
+            desired = s0 + np.maximum(0., v * T + v * dv / root_ab)
+            return a * (1 - (v / v0) ** 4 - (desired / np.maximum(gap, 0.1)) ** 2)
+
+        # lane leader: bumper-to-bumper gap and approach rate
+        gap = np.where(has_leader, np.where(fwd, pos[lead] - front, pos - pos[lead] - size[lead]), np.inf)
+        acc = acceleration(gap, v - v[lead])
+
+        # stop position, treated as a standing obstacle s0 beyond it
+        line = np.where(fwd, c.defaultStop - front, pos - c.defaultStop)
+        hold = ~crossed & ~green & (v * v <= 2 * b * np.maximum(line, 0.) + 1e-9)
+        acc = np.where(hold, np.minimum(acc, acceleration(line + s0, v)), acc)
+
+        velocity = np.maximum(v + acc, 0.)
+        advance = np.minimum(0.5 * (v + velocity), np.maximum(gap, 0.))
+        advance = np.where(hold, np.minimum(advance, np.maximum(line, 0.)), advance)
+        # a held vehicle never goes faster than it can shed at b before the
+        # stop position, so it still counts as able to stop on the next frame
+        velocity = np.where(hold, np.minimum(velocity, np.sqrt(2 * b * np.maximum(line - advance, 0.))), velocity)
+        v[:] = velocity
+        return advance, (velocity < HALT_SPEED) & ~crossed
+
+    def retire(self, slot):
+        """Take a vehicle off the lanes and counters and return its slot to the pool."""
+        st = self.state
+        v = self.handles[slot]
+        self.vehicles[v.direction][v.lane].remove(slot)
+        self.counters.despawn(int(st.direction[slot]), int(st.cls[slot]), bool(st.crossed[slot]), int(st.turned[slot]))
+        self.emergencies.remove(slot)
+        st.release(slot)
+        self.retired += 1
+        self._layout = None
+
+    def _finish_turn(self, v):
+        """Merge a vehicle that completed its turn into the next direction's lane."""
+        st = self.state
+        self.vehicles[v.direction][v.lane].remove(v.slot)
+        st.turned[v.slot] = True
+        st.direction[v.slot] = (st.direction[v.slot] + 1) % 4
+        self._layout = None
+        self.vehicles[v.direction][v.lane].merge(v.slot, self._progress)
+
+    def _progress(self, slot):
+        """Distance travelled along the vehicle's current heading."""
+        st = self.state
+        d = st.direction[slot]
+        pos = st.y[slot] if ALONG_Y[d] else st.x[slot]
+        return pos if FORWARD[d] else -pos
+
+    # ----------------------
+    # SIGNAL FUNCTIONS
+    # ----------------------
+    def initialize_signals(self):
+        self.signals = [TrafficSignal(self.defaultRed, self.defaultYellow, self.defaultGreen,
+                                      self.defaultMinimum, self.defaultMaximum)
+                        for i in range(config.noOfSignals)]
+
+    def setTime(self):
+        counts = self.counters.waiting_by_class(self.nextGreen)
+        # if any emergency present give fixed minimum green
+        if counts['ambulance'] > 0 or counts['firetruck'] > 0 or counts['vip'] > 0:
+            greenTime = max(self.defaultMinimum, 7)
+        else:
+            greenTime = math.ceil((counts['car']*self.carTime + counts['bus']*self.busTime +
+                                   counts['truck']*self.truckTime + counts['rickshaw']*self.rickshawTime +
+                                   counts['bike']*self.bikeTime)/(self.noOfLanes+1))
+            greenTime = max(self.defaultMinimum, min(self.defaultMaximum, greenTime))
+        self.signals[self.nextGreen].green = greenTime
+
+    def updateValues(self):
+        for i in range(config.noOfSignals):
+            if i == self.currentGreen:
+                if self.currentYellow == 0:
+                    self.signals[i].green -= 1
+                    self.signals[i].totalGreenTime += 1
+                else:
+                    self.signals[i].yellow -= 1
+            else:
+                self.signals[i].red -= 1
+
+    # ----------------------
+    # Spatial queries
+    # ----------------------
+    def spatial(self):
+        """The spatial grid, current as of the vehicles' latest positions."""
+        if self._gridStale:
+            self.grid.update(self.state)
+            self._gridStale = False
+        return self.grid
+
+    def vehicle_ahead(self, v, lookahead=200.):
+        """(Vehicle, gap in pixels) nearest ahead of v along its heading, or (None, inf)."""
+        slot, gap = self.spatial().ahead(v.slot, lookahead)
+        return (self.handles[slot] if slot >= 0 else None), gap
+
+    def in_conflict_zone(self):
+        """Vehicles inside the intersection box."""
+        return [self.handles[slot] for slot in self.spatial().inside(*config.conflictZone)]
+
+    def box_clear(self, origin):
+        """True if no vehicle from an approach other than `origin` is inside the intersection box."""
+        inside = self.spatial().inside(*config.conflictZone)
+        return not (self.state.origin[inside] != origin).any()
+
+    # ----------------------
+    # EMERGENCY DETECTION (PRIORITY RULES)
+    # ----------------------
+    def nearest_emergency(self):
+        """The emergency that wins preemption, with its distance and ETA, or None."""
+        return self.emergencies.highest_priority()
+
+    def detect_emergency(self):
+        """
+        Return direction index for highest-priority emergency:
+        1) nearest ambulance if any
+        2) else nearest firetruck if any
+        3) else nearest vip if any
+        4) else None
+        """
+        found = self.emergencies.highest_priority()
+        return None if found is None else found.direction
+
+    def _preempt(self, detected):
+        """Immediate emergency preemption: all red, instant green to the emergency lane."""
+        self.currentYellow = 0
+        self.currentGreen = detected
+        self.nextGreen = (self.currentGreen + 1) % config.noOfSignals
+        for s in self.signals:
+            s.red = self.defaultRed
+            s.yellow = self.defaultYellow
+            s.green = 0
+        self.signals[self.currentGreen].green = max(self.defaultMinimum, 10)
+        self.signals[self.currentGreen].yellow = self.defaultYellow
+
+    # ----------------------
+    # SIGNAL UPDATE LOGIC
+    # ----------------------
+    def _sleep(self):
+        """
+        Wait for the next controller second (the old time.sleep(1)). An
+        emergency arriving meanwhile is checked straight away; returns True
+        if it preempted the signals.
+        """
+        while True:
+            if (yield) != EMERGENCY:
+                return False
+            detected = self.detect_emergency()
+            if detected is not None and detected != self.currentGreen:
+                self._preempt(detected)
+                return True
+
+    def _controllerLoop(self):
+        """
+        The old repeat_loop thread as a generator, resumed by SIGNAL events
+        once per simulated second and by EMERGENCY events in between.
+        """
+        while True:
+            detected = self.detect_emergency()
+            if detected is not None:
+                self._preempt(detected)
+
+            # Run current green phase
+            while self.signals[self.currentGreen].green > 0:
+                detected = self.detect_emergency()
+                if detected is not None and detected != self.currentGreen:
+                    self._preempt(detected)
+                    break
+                self.updateValues()
+                if self.signals[self.nextGreen].red == self.detectionTime:
+                    self.events.schedule(self.clock, DETECTION)
+                if (yield from self._sleep()):
+                    break
+
+            # Yellow phase (only if no emergency overrides)
+            self.currentYellow = 1
+
+            while self.signals[self.currentGreen].yellow > 0:
+                detected = self.detect_emergency()
+                if detected is not None and detected != self.currentGreen:
+                    self._preempt(detected)
+                    break
+                self.updateValues()
+                if (yield from self._sleep()):
+                    break
+
+            # Reset and find next green normally (if no emergency)
+            self.currentYellow = 0
+            current = self.signals[self.currentGreen]
+            current.green = self.defaultGreen
+            current.yellow = self.defaultYellow
+            current.red = self.defaultRed
+
+            detected = self.detect_emergency()
+            if detected is not None:
+                self.nextGreen = detected
+            else:
+                vehicle_counts = self.counters.waiting.sum(axis=1).tolist()
+                self.nextGreen = vehicle_counts.index(max(vehicle_counts))
+
+            self.currentGreen = self.nextGreen
+            self.signals[self.nextGreen].red = self.signals[self.currentGreen].yellow + self.signals[self.currentGreen].green
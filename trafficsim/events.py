@@ -0,0 +1,53 @@
+# trafficsim/events.py
+# Timestamped event queue driving the simulation on a virtual clock.
+
+import heapq
+import itertools
+
+# event kinds; at equal timestamps they fire in this order
+SECOND = 'second'        # timeElapsed += 1
+SIGNAL = 'signal'        # resume the signal controller (phase countdowns)
+SPAWN = 'spawn'          # generate one vehicle
+EMERGENCY = 'emergency'  # an emergency vehicle arrived; the controller may preempt at once
+DETECTION = 'detection'  # next green's red reached detectionTime: size its green time
+FRAME = 'frame'          # move every vehicle by one frame
+
+ORDER = {kind: i for i, kind in enumerate((SECOND, SIGNAL, SPAWN, EMERGENCY, DETECTION, FRAME))}
+
+
+class EventQueue:
+    """
+    Min-heap of (time, kind order, sequence) entries. The sequence number
+    makes the order of simultaneous events of one kind the order they were
+    scheduled in, so a run is fully determined by its seed.
+    """
+
+    def __init__(self):
+        self.heap = list()
+        self.counter = itertools.count()
+        self.now = 0.
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, time, kind, data=None):
+        entry = [time, ORDER[kind], next(self.counter), kind, data]
+        heapq.heappush(self.heap, entry)
+        return entry
+
+    def cancel(self, entry):
+        """Lazily drop a scheduled event; it is skipped when popped."""
+        entry[3] = None
+
+    def peek(self):
+        """Time of the next live event, or None."""
+        while self.heap and self.heap[0][3] is None:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def pop(self):
+        """Remove the next live event, advance the clock to it and return (time, kind, data)."""
+        self.peek()
+        time, _, _, kind, data = heapq.heappop(self.heap)
+        self.now = time
+        return time, kind, data
@@ -0,0 +1,146 @@
+# trafficsim/kpi.py
+# Per-vehicle and per-approach KPIs kept in preallocated NumPy ring
+# buffers: wait time, stop count, stop-line clearance time and delay of
+# every vehicle that crosses, and the queue length of every approach once per
+# simulated second. Nothing here allocates per vehicle.
+
+import numpy as np
+
+from . import config
+from .counters import EMERGENCY_CLASSES
+
+noOfSignals = config.noOfSignals
+IS_EMERGENCY = np.isin(np.arange(len(config.vehicleTypes)), EMERGENCY_CLASSES)
+
+# one row per vehicle crossing its stop line
+CROSSING = np.dtype([
+    ('time', np.float64),    # simulated time of the crossing
+    ('cls', np.int8),
+    ('wait', np.float32),    # seconds spent stopped before the stop line
+    ('stops', np.int16),     # times the vehicle came to a halt
+    ('clear', np.float32),   # seconds from spawn to crossing the stop line
+    ('delay', np.float32),   # clear minus the free-flow time at the class speed
+])
+
+# one row per simulated second
+QUEUE = np.dtype([
+    ('time', np.float64),
+    ('length', np.int32, noOfSignals),   # halted vehicles before the stop line, per approach
+])
+
+METRICS = ('wait', 'stops', 'clear', 'delay')
+
+
+class RingBuffer:
+    """Fixed-capacity structured array; pushing past capacity overwrites the oldest rows."""
+
+    def __init__(self, dtype, capacity):
+        self.data = np.zeros(capacity, dtype)
+        self.capacity = capacity
+        self.head = 0    # next row to write
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, rows):
+        k = len(rows)
+        if k >= self.capacity:
+            rows, k = rows[-self.capacity:], self.capacity
+        end = self.head + k
+        if end <= self.capacity:
+            self.data[self.head:end] = rows
+        else:
+            split = self.capacity - self.head
+            self.data[self.head:] = rows[:split]
+            self.data[:end - self.capacity] = rows[split:]
+        self.head = end % self.capacity
+        self.count = min(self.count + k, self.capacity)
+
+    def values(self):
+        """The stored rows, oldest first (a copy once the buffer has wrapped)."""
+        if self.count < self.capacity:
+            return self.data[:self.count]
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+
+def _stats(values):
+    if not len(values):
+        return dict(p50=0., p95=0., max=0.)
+    p50, p95 = np.percentile(values, (50, 95))
+    return dict(p50=float(p50), p95=float(p95), max=float(values.max()))
+
+
+class KpiCollector:
+    """
+    crossings[direction]  the last `window` vehicles that crossed on each approach
+    queues                the last `history` one-second queue length samples
+
+    The engine feeds it a whole frame's crossings at once and one queue
+    sample per second. With constant kinematics vehicles either drive at
+    full speed or stand still, so delay equals wait (to within a frame);
+    with IDM delay also counts the time lost braking and accelerating,
+    which wait, counting only standstill, misses.
+    """
+
+    def __init__(self, window=1024, history=3600):
+        self.crossings = [RingBuffer(CROSSING, window) for _ in range(noOfSignals)]
+        self.queues = RingBuffer(QUEUE, history)
+        self.sample = np.zeros(1, QUEUE)
+
+    def cross(self, time, directions, classes, wait, stops, clear, delay):
+        """Record a batch of stop-line crossings (parallel arrays, one entry per vehicle)."""
+        rows = np.empty(len(directions), CROSSING)
+        rows['time'] = time
+        rows['cls'] = classes
+        rows['wait'] = wait
+        rows['stops'] = stops
+        rows['clear'] = clear
+        rows['delay'] = delay
+        if len(rows) == 1:
+            self.crossings[directions[0]].push(rows)
+            return
+        for i in np.unique(directions):
+            self.crossings[i].push(rows[directions == i])
+
+    def queue(self, time, state):
+        """Sample the number of halted, not yet crossed vehicles on every approach."""
+        queued = state.view('alive') & state.view('halted') & ~state.view('crossed')
+        self.sample['time'] = time
+        self.sample['length'][0] = np.bincount(state.view('direction')[queued], minlength=noOfSignals)
+        self.queues.push(self.sample)
+
+    # ----------------------
+    # Rolling aggregates
+    # ----------------------
+    def aggregate(self, direction, emergency=None):
+        """
+        {metric: {p50, p95, max}} over the crossings kept for one approach,
+        plus their count. emergency=True / False restricts the rows to
+        emergency / ordinary vehicles.
+        """
+        rows = self.crossings[direction].values()
+        if emergency is not None:
+            rows = rows[IS_EMERGENCY[rows['cls']] == emergency]
+        result = {metric: _stats(rows[metric]) for metric in METRICS}
+        result['count'] = len(rows)
+        return result
+
+    def queue_stats(self, direction):
+        return _stats(self.queues.values()['length'][:, direction])
+
+    def report(self):
+        """Every aggregate, keyed by direction name."""
+        return {config.directionNumbers[i]: dict(self.aggregate(i),
+                                                 emergency=self.aggregate(i, emergency=True),
+                                                 queue=self.queue_stats(i))
+                for i in range(noOfSignals)}
+
+    def percentile(self, metric, q):
+        """Percentile of one metric over the crossings kept for every approach."""
+        values = np.concatenate([ring.values()[metric] for ring in self.crossings])
+        return float(np.percentile(values, q)) if len(values) else 0.
+
+    def max_queue(self):
+        samples = self.queues.values()['length']
+        return int(samples.max()) if len(samples) else 0
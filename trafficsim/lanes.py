@@ -0,0 +1,96 @@
+# trafficsim/lanes.py
+# Lane bookkeeping without list.index / list.remove: each lane is a doubly
+# linked list threaded through the leader/follower columns of VehicleState.
+
+from .config import directionNumbers
+
+
+class LaneQueue:
+    """
+    Vehicles of one lane from front (head) to back (tail). A vehicle keeps
+    its state slot for life; state.leader[slot] is the vehicle in front of
+    it and state.follower[slot] the one behind, so leader lookup, append
+    and removal are O(1). Iterating yields the Vehicle handles in
+    front-to-back order, like the plain lists this replaces.
+    """
+    __slots__ = ('state', 'handles', 'head', 'tail', 'size')
+
+    def __init__(self, state, handles):
+        self.state = state
+        self.handles = handles  # slot -> Vehicle handle
+        self.head = -1
+        self.tail = -1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        slot = self.head
+        while slot >= 0:
+            # read the column each time: it is replaced when the state grows
+            yield self.handles[slot]
+            slot = self.state.follower[slot]
+
+    def slots(self):
+        slot, follower = self.head, self.state.follower
+        while slot >= 0:
+            yield int(slot)
+            slot = follower[slot]
+
+    def append(self, slot):
+        """Queue a vehicle at the back of the lane."""
+        self._link(self.tail, slot, -1)
+
+    def remove(self, slot):
+        """Unlink a vehicle; its follower now follows its leader."""
+        st = self.state
+        front, back = st.leader[slot], st.follower[slot]
+        if front >= 0:
+            st.follower[front] = back
+        else:
+            self.head = back
+        if back >= 0:
+            st.leader[back] = front
+        else:
+            self.tail = front
+        st.leader[slot] = st.follower[slot] = -1
+        self.size -= 1
+
+    def merge(self, slot, progress):
+        """
+        Insert a vehicle joining the lane mid-way (a finished turn) behind
+        every vehicle that is further along the lane. progress(slot) is the
+        distance travelled along the lane's heading. The walk starts at the
+        tail, so it only costs the number of vehicles queued behind the
+        merge point.
+        """
+        st = self.state
+        mine = progress(slot)
+        back = -1
+        front = self.tail
+        while front >= 0 and progress(front) < mine:
+            back, front = front, st.leader[front]
+        self._link(front, slot, back)
+
+    def _link(self, front, slot, back):
+        st = self.state
+        st.leader[slot] = front
+        st.follower[slot] = back
+        if front >= 0:
+            st.follower[front] = slot
+        else:
+            self.head = slot
+        if back >= 0:
+            st.leader[back] = slot
+        else:
+            self.tail = slot
+        self.size += 1
+
+
+def new_lanes(state, handles):
+    """The per-direction lane table: vehicles[direction][lane] plus the crossed counter."""
+    return {
+        d: {0: LaneQueue(state, handles), 1: LaneQueue(state, handles), 2: LaneQueue(state, handles), 'crossed': 0}
+        for d in directionNumbers.values()
+    }
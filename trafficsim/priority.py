@@ -0,0 +1,97 @@
+# trafficsim/priority.py
+# Index of waiting emergency vehicles, so "which approach has the most
+# urgent emergency" does not walk every vehicle of every lane.
+
+from collections import deque, namedtuple
+
+import numpy as np
+
+from . import config
+
+Emergency = namedtuple('Emergency', 'vehicleClass direction lane slot distance eta')
+
+# axis / sign / stop line per direction code, as in engine.move()
+_along_y = np.array([config.directionNumbers[i] in ('down', 'up') for i in range(4)])
+_forward = np.array([config.directionNumbers[i] in ('right', 'down') for i in range(4)])
+_stop_line = np.array([config.stopLines[config.directionNumbers[i]] for i in range(4)], np.float64)
+
+
+class EmergencyIndex:
+    """
+    Waiting (not yet crossed) emergency vehicles, one FIFO per
+    (class, direction, lane). Vehicles cannot overtake inside a lane, so
+    the head of each FIFO is the one closest to the stop line and only
+    those heads - at most 4 directions x 3 lanes per class - have to be
+    compared, whatever the size of the fleet.
+
+    Classes are ranked by config.emergencyClasses: ambulance, then
+    firetruck, then vip.
+    """
+
+    def __init__(self, state, fps=config.fps):
+        self.state = state
+        self.fps = fps
+        self.keys = {
+            c: [(config.classIndex[c], d, l) for d in range(4) for l in range(3)]
+            for c in config.emergencyClasses
+        }
+        self.queues = {k: deque() for keys in self.keys.values() for k in keys}
+        self.where = dict()  # slot -> queue key
+
+    def __len__(self):
+        return len(self.where)
+
+    def spawn(self, slot, cls, direction, lane):
+        key = (cls, direction, lane)
+        self.queues[key].append(slot)
+        self.where[slot] = key
+
+    def remove(self, slot):
+        """Drop a vehicle that crossed its stop line or left the simulation."""
+        key = self.where.pop(slot, None)
+        if key is None:
+            return
+        queue = self.queues[key]
+        if queue[0] == slot:
+            queue.popleft()
+        else:
+            queue.remove(slot)
+
+    def distance(self, slots):
+        """Distance to the stop line (negative once past it), as in _distance_to_stop."""
+        st = self.state
+        d = st.direction[slots]
+        pos = np.where(_along_y[d], st.y[slots], st.x[slots])
+        size = np.where(_along_y[d], st.height[slots], st.width[slots])
+        return np.where(_forward[d], _stop_line[d] - (pos + size), pos - _stop_line[d])
+
+    def nearest(self, vehicleClass):
+        """Closest waiting vehicle of one class, or None."""
+        keys = [k for k in self.keys[vehicleClass] if self.queues[k]]
+        if not keys:
+            return None
+        heads = np.array([self.queues[k][0] for k in keys])
+        dist = self.distance(heads)
+        i = int(np.argmin(dist))
+        slot = int(heads[i])
+        speed = self.state.speed[slot] * self.fps
+        return Emergency(vehicleClass, keys[i][1], keys[i][2], slot, float(dist[i]),
+                         max(float(dist[i]), 0.) / speed if speed > 0 else float('inf'))
+
+    def verify(self):
+        """Cross-check membership against a full scan of the vehicle state."""
+        st = self.state
+        scan = np.flatnonzero(st.view('alive') & ~st.view('crossed') &
+                              np.isin(st.view('cls'), [config.classIndex[c] for c in config.emergencyClasses]))
+        if set(scan.tolist()) != set(self.where):
+            raise AssertionError('emergency index out of sync: {} != scan {}'.format(sorted(self.where), scan))
+
+    def highest_priority(self):
+        """Nearest ambulance, else nearest firetruck, else nearest vip, else None."""
+        if not self.where:
+            return None
+        for vehicleClass in config.emergencyClasses:
+            found = self.nearest(vehicleClass)
+            if found is not None:
+                return found
+        return None
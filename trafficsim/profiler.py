@@ -0,0 +1,91 @@
+# trafficsim/profiler.py
+# Per-frame timing breakdown of the main loop: one row per frame, one
+# column per section, in a preallocated array. Dumped to CSV or NPZ and
+# summarised as percentiles when the run ends.
+
+import time
+
+import numpy as np
+
+# viewer sections, in loop order
+VIEWER_SECTIONS = ('events', 'engine', 'background', 'signals', 'text', 'vehicles', 'dashboard', 'overlay',
+                   'siren', 'update', 'idle')
+# engine sections, a breakdown of 'engine' (see SimulationEngine.run_until)
+ENGINE_SECTIONS = ('move', 'controller', 'spawner', 'timers', 'snapshot')
+SECTIONS = VIEWER_SECTIONS + ENGINE_SECTIONS + ('frame',)
+
+
+class FrameProfiler:
+    """
+    Call begin() at the top of a frame and lap(name) after each section:
+    the time since the previous lap is added to that section of the
+    current frame, so a section may be lapped more than once per frame.
+    add(name, seconds) records time measured elsewhere (the engine's own
+    breakdown) without moving the lap mark. end() closes the frame and
+    stores its total in the 'frame' column. Times are kept in ms.
+    """
+
+    def __init__(self, sections=SECTIONS, capacity=4096):
+        self.sections = tuple(sections)
+        self.column = {name: i for i, name in enumerate(self.sections)}
+        self.data = np.zeros((capacity, len(self.sections)))
+        self.frames = 0
+        self.row = self.data[0]
+        self.started = self.mark = 0.
+
+    def begin(self):
+        if self.frames == len(self.data):
+            self.data = np.concatenate((self.data, np.zeros_like(self.data)))
+        self.row = self.data[self.frames]
+        self.started = self.mark = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.row[self.column[name]] += (now - self.mark) * 1000.
+        self.mark = now
+
+    def add(self, name, seconds):
+        self.row[self.column[name]] += seconds * 1000.
+
+    def end(self):
+        self.row[self.column['frame']] = (time.perf_counter() - self.started) * 1000.
+        self.frames += 1
+
+    # ----------------------
+    # Results
+    # ----------------------
+    def recent(self, frames=30):
+        """Mean ms per section over the last `frames` complete frames."""
+        rows = self.data[max(self.frames - frames, 0):self.frames]
+        means = rows.mean(axis=0) if len(rows) else np.zeros(len(self.sections))
+        return dict(zip(self.sections, means.tolist()))
+
+    def summary(self):
+        """{section: {mean, p50, p95, p99, max}} in ms over every recorded frame."""
+        rows = self.data[:self.frames]
+        result = dict()
+        for name, i in self.column.items():
+            values = rows[:, i]
+            if not len(values) or not values.any():
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            result[name] = dict(mean=float(values.mean()), p50=float(p50), p95=float(p95), p99=float(p99),
+                                max=float(values.max()))
+        return result
+
+    def dump(self, path):
+        """Write every frame's row to path: NPZ for a .npz name, CSV otherwise."""
+        rows = self.data[:self.frames]
+        if path.endswith('.npz'):
+            np.savez(path, sections=np.array(self.sections), ms=rows)
+        else:
+            np.savetxt(path, rows, fmt='%.4f', delimiter=',', header=','.join(self.sections), comments='')
+
+    def report(self):
+        lines = ['{:>12} {:>8} {:>8} {:>8} {:>8} {:>8}   ({} frames, ms)'.format(
+            'section', 'mean', 'p50', 'p95', 'p99', 'max', self.frames)]
+        for name, stats in self.summary().items():
+            indent = '  ' if name in ENGINE_SECTIONS else ''
+            lines.append('{:>12} {mean:8.3f} {p50:8.3f} {p95:8.3f} {p99:8.3f} {max:8.3f}'.format(
+                indent + name, **stats))
+        return '\n'.join(lines)
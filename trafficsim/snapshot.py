@@ -0,0 +1,66 @@
+# trafficsim/snapshot.py
+# Immutable, versioned views of the engine state for readers on other
+# threads (the viewer, metrics export, an external API).
+
+from collections import namedtuple
+
+import numpy as np
+
+# per-signal (red, yellow, green, totalGreenTime)
+SignalState = namedtuple('SignalState', 'red yellow green totalGreenTime')
+
+Frame = namedtuple('Frame', [
+    'version', 'clock', 'timeElapsed', 'finished',
+    'currentGreen', 'currentYellow', 'nextGreen', 'signals',
+    'crossed', 'emergencies_waiting',
+    # one row per live vehicle, in slot order
+    'slot', 'x', 'y', 'width', 'height', 'direction', 'origin', 'cls', 'isCrossed', 'angle',
+])
+
+# VehicleState column behind each per-vehicle Frame field
+COLUMNS = (('x', 'x'), ('y', 'y'), ('width', 'width'), ('height', 'height'),
+           ('direction', 'direction'), ('origin', 'origin'), ('cls', 'cls'),
+           ('isCrossed', 'crossed'), ('angle', 'angle'))
+
+
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+class SnapshotPublisher:
+    """
+    The engine thread calls publish() between events, when its state is
+    consistent (a preemption is always applied within one event). It
+    builds a new Frame - compact copies of the live rows plus signal
+    tuples, all read-only - and swaps it in with a single reference
+    assignment. Readers take `latest` and keep using that Frame for as
+    long as they like: they never copy, never lock and never see a
+    half-applied update, because a published Frame is never written again.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.latest = None
+
+    def publish(self, engine):
+        st = engine.state
+        live = _frozen(np.flatnonzero(st.view('alive')))
+        rows = {field: _frozen(getattr(st, column)[live]) for field, column in COLUMNS}
+        self.version += 1
+        frame = Frame(
+            version=self.version,
+            clock=engine.clock,
+            timeElapsed=engine.timeElapsed,
+            finished=engine.finished,
+            currentGreen=engine.currentGreen,
+            currentYellow=engine.currentYellow,
+            nextGreen=engine.nextGreen,
+            signals=tuple(SignalState(s.red, s.yellow, s.green, s.totalGreenTime) for s in engine.signals),
+            crossed=tuple(int(c) for c in engine.counters.crossed),
+            emergencies_waiting=engine.counters.emergency_waiting(),
+            slot=live,
+            **rows
+        )
+        self.latest = frame
+        return frame
@@ -0,0 +1,146 @@
+# trafficsim/spatial.py
+# Uniform-grid spatial hash over the canvas: which vehicles are near a
+# point, ahead of a vehicle or inside the intersection, without pairwise
+# scans.
+
+import numpy as np
+
+from .config import SCREEN_W, SCREEN_H
+
+# direction index -> unit heading (right, down, left, up)
+HEADING_X = np.array([1, 0, -1, 0])
+HEADING_Y = np.array([0, 1, 0, -1])
+# sprites are placed by their top / left edge, whatever their width, so the
+# line a lane's vehicles share runs this far inside that edge (half a bike)
+LANE_LINE = 8.
+
+
+class SpatialGrid:
+    """
+    Files every live vehicle under each cell its footprint touches.
+    Anything off the canvas is clamped into the border cells, so vehicles
+    entering or leaving are still found.
+
+    update() is incremental: the cell range of every vehicle is compared
+    with the one it is filed under, and only vehicles that spawned,
+    retired or moved into another cell are re-filed. At about 4.5 px per
+    frame a vehicle changes cells once every dozen frames, so an update
+    touches a few vehicles whatever the population. A query touches only
+    the cells under its rectangle, so with cells about one vehicle long
+    it costs O(1) per vehicle at any density.
+    """
+
+    def __init__(self, cell=64, width=SCREEN_W, height=SCREEN_H):
+        self.cell = cell
+        self.cols = -(-width // cell)
+        self.rows = -(-height // cell)
+        self.cells = [set() for _ in range(self.cols * self.rows)]
+        # per slot: first column, first row, last column, last row it is filed under; -1 if not filed
+        self.spans = np.full((0, 4), -1, np.int64)
+        self.state = None
+
+    def _cols(self, left, right):
+        return (np.clip(left // self.cell, 0, self.cols - 1).astype(np.int64),
+                np.clip(right // self.cell, 0, self.cols - 1).astype(np.int64))
+
+    def _rows(self, top, bottom):
+        return (np.clip(top // self.cell, 0, self.rows - 1).astype(np.int64),
+                np.clip(bottom // self.cell, 0, self.rows - 1).astype(np.int64))
+
+    def _cells(self, c0, r0, c1, r1):
+        return [r * self.cols + c for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+    def update(self, state):
+        """Re-file the vehicles whose cells changed since the last update."""
+        self.state = state
+        n = state.n
+        if len(self.spans) < n:
+            spans = np.full((state.capacity, 4), -1, np.int64)
+            spans[:len(self.spans)] = self.spans
+            self.spans = spans
+        x, y = state.view('x'), state.view('y')
+        c0, c1 = self._cols(x, x + state.view('width'))
+        r0, r1 = self._rows(y, y + state.view('height'))
+        spans = np.stack((c0, r0, c1, r1), axis=1)
+        spans[~state.view('alive')] = -1
+        cells = self.cells
+        for slot in np.flatnonzero((spans != self.spans[:n]).any(axis=1)).tolist():
+            old, new = self.spans[slot].tolist(), spans[slot].tolist()
+            if old[0] >= 0:
+                for cell in self._cells(*old):
+                    cells[cell].discard(slot)
+            if new[0] >= 0:
+                for cell in self._cells(*new):
+                    cells[cell].add(slot)
+            self.spans[slot] = new
+
+    # ----------------------
+    # Queries
+    # ----------------------
+    def candidates(self, left, top, right, bottom):
+        """Slots filed under the cells of a rectangle (a superset of the vehicles touching it), in slot order."""
+        c0, c1 = self._cols(left, right)
+        r0, r1 = self._rows(top, bottom)
+        found = set()
+        for cell in self._cells(int(c0), int(r0), int(c1), int(r1)):
+            found |= self.cells[cell]
+        return np.array(sorted(found), np.int64)
+
+    def inside(self, left, top, right, bottom):
+        """Slots whose footprint overlaps the rectangle, in slot order."""
+        st = self.state
+        slots = self.candidates(left, top, right, bottom)
+        x, y = st.x[slots], st.y[slots]
+        hit = (x < right) & (x + st.width[slots] > left) & (y < bottom) & (y + st.height[slots] > top)
+        return slots[hit]
+
+    def ahead(self, slot, lookahead=200.):
+        """
+        (slot, gap) of the nearest vehicle in front of `slot` along its
+        heading: its footprint crosses our lane line (LANE_LINE inside our
+        top / left edge) and its rear is at most lookahead pixels beyond
+        our front. Side-by-side vehicles and vehicles we already overlap
+        do not count. (-1, inf) if there is none.
+        """
+        st = self.state
+        d = int(st.direction[slot])
+        x, y, w, h = float(st.x[slot]), float(st.y[slot]), float(st.width[slot]), float(st.height[slot])
+        dx, dy = HEADING_X[d], HEADING_Y[d]
+        # search band: our lane line, from our front edge out to lookahead
+        if dx:
+            front = x + w if dx > 0 else x
+            left, right = (front, front + lookahead) if dx > 0 else (front - lookahead, front)
+            top = bottom = y + LANE_LINE
+        else:
+            front = y + h if dy > 0 else y
+            top, bottom = (front, front + lookahead) if dy > 0 else (front - lookahead, front)
+            left = right = x + LANE_LINE
+        others = self.candidates(left, top, right, bottom)
+        others = others[others != slot]
+        ox, oy, ow, oh = st.x[others], st.y[others], st.width[others], st.height[others]
+        if dx:
+            across = (oy < top) & (oy + oh > top)
+            gap = ox - front if dx > 0 else front - (ox + ow)
+        else:
+            across = (ox < left) & (ox + ow > left)
+            gap = oy - front if dy > 0 else front - (oy + oh)
+        keep = across & (gap >= 0) & (gap <= lookahead)
+        if not keep.any():
+            return -1, float('inf')
+        others, gap = others[keep], gap[keep]
+        i = int(np.argmin(gap))
+        return int(others[i]), float(gap[i])
+
+    # ----------------------
+    # Debug
+    # ----------------------
+    def verify(self, state, rect):
+        """Cross-check inside(rect) against a full scan of the vehicle state."""
+        left, top, right, bottom = rect
+        alive = state.view('alive')
+        x, y = state.view('x'), state.view('y')
+        scan = np.flatnonzero(alive & (x < right) & (x + state.view('width') > left)
+                              & (y < bottom) & (y + state.view('height') > top))
+        found = self.inside(left, top, right, bottom)
+        if not np.array_equal(scan, found):
+            raise AssertionError('spatial grid out of sync: {} != scan {}'.format(found.tolist(), scan.tolist()))
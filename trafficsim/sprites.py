@@ -0,0 +1,112 @@
+# trafficsim/sprites.py
+# Shared, pre-rotated vehicle sprites for the pygame viewer.
+
+from collections import OrderedDict
+
+import pygame
+
+from . import config
+
+
+class SpriteCache:
+    """
+    Rotated vehicle images keyed by (direction, vehicleClass, angle), with
+    the angle quantized to `step` degrees. Every rotation is built once with
+    pygame.transform.rotate and then shared by all vehicles, so callers
+    must treat the returned surfaces as read-only. At most `maxsize`
+    surfaces are kept; the least recently used one is dropped first.
+
+    `loader(direction, vehicleClass)` returns the unrotated source image.
+    """
+
+    def __init__(self, loader, step=config.rotationAngle, maxsize=1024):
+        self.loader = loader
+        self.step = step
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, angle):
+        return int(round(angle / self.step)) * self.step % 360
+
+    def get(self, direction, vehicleClass, angle=0):
+        key = (direction, vehicleClass, self.quantize(angle))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        if key[2] == 0:
+            surface = self.loader(direction, vehicleClass)
+        else:
+            surface = pygame.transform.rotate(self.get(direction, vehicleClass, 0), -key[2])
+        self.surfaces[key] = surface
+        while len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def preload(self, angles=range(0, 91, config.rotationAngle)):
+        """Build every rotation a turning vehicle can go through up front."""
+        for direction in config.directionNumbers.values():
+            for vehicleClass in config.vehicleTypes.values():
+                for angle in angles:
+                    self.get(direction, vehicleClass, angle)
+        # warm-up lookups are not representative of the run
+        self.hits = self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def stats(self):
+        return 'sprite cache: {} surfaces, {} hits, {} misses, {} evictions, hit rate {:.1%}'.format(
+            len(self.surfaces), self.hits, self.misses, self.evictions, self.hit_rate)
+
+
+class TextCache:
+    """
+    Rendered text surfaces keyed by (text, color, background), LRU bounded.
+    Signal timers, counters and labels repeat the same few strings frame
+    after frame, so font.render only runs when a value actually changes.
+    """
+
+    def __init__(self, font, maxsize=512):
+        self.font = font
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color, background=None):
+        key = (text, color, background)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font.render(text, True, color, background)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.maxsize:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+class HaloCache:
+    """The translucent red emergency halo, built once per sprite size."""
+
+    def __init__(self, color=(255,0,0,120), margin=5):
+        self.color = color
+        self.margin = margin
+        self.surfaces = dict()
+
+    def get(self, size):
+        surface = self.surfaces.get(size)
+        if surface is None:
+            w, h = size
+            surface = pygame.Surface((w + 2*self.margin, h + 2*self.margin), pygame.SRCALPHA)
+            pygame.draw.rect(surface, self.color, surface.get_rect(), border_radius=5)
+            self.surfaces[size] = surface
+        return surface
@@ -0,0 +1,143 @@
+# trafficsim/state.py
+# Struct-of-arrays vehicle storage. Every per-vehicle attribute lives in a
+# preallocated NumPy column indexed by a slot number, so one frame of
+# movement for all vehicles is a handful of array operations.
+
+import numpy as np
+
+from .config import directionNumbers, vehicleTypes
+
+# name -> dtype of every column
+FIELDS = (
+    ('x', np.float64),
+    ('y', np.float64),
+    ('width', np.float64),       # footprint of the current (rotated) sprite
+    ('height', np.float64),
+    ('baseWidth', np.float64),   # footprint of the sprite as spawned
+    ('baseHeight', np.float64),
+    ('speed', np.float64),       # desired speed, pixels per frame
+    ('velocity', np.float64),    # current speed, pixels per frame
+    ('stop', np.float64),
+    ('angle', np.float64),       # rotateAngle while turning
+    ('spawnTime', np.float64),   # simulated seconds
+    ('crossTime', np.float64),   # simulated seconds, valid once crossed
+    ('freeTime', np.float64),    # seconds from spawn to the stop line at the desired speed
+    ('waited', np.int32),        # frames spent stopped before the stop line
+    ('stops', np.int16),         # times the vehicle came to a halt before the stop line
+    ('uid', np.int32),           # spawn sequence number; unlike the slot, never reused
+    ('lane', np.int8),
+    ('direction', np.int8),      # current heading, index into directionNumbers
+    ('origin', np.int8),         # direction_number at spawn time
+    ('cls', np.int8),            # index into vehicleTypes
+    ('crossed', np.bool_),
+    ('willTurn', np.bool_),
+    ('turned', np.bool_),
+    ('alive', np.bool_),
+    ('halted', np.bool_),        # standing still this frame
+    ('leader', np.int32),        # slot of the vehicle in front in the same lane, -1 if none
+    ('follower', np.int32),      # slot of the vehicle behind in the same lane, -1 if none
+)
+
+
+class VehicleState:
+    """
+    Column store for vehicles. Rows below the high-water mark `n` have
+    been used; `alive` tells which of them hold a vehicle right now.
+    release() returns a slot to a free list and add() reuses freed slots
+    before claiming new rows, so a long run stays at the size of its peak
+    population. Columns double in size when full, so callers must re-read
+    attributes after add() instead of holding on to column references
+    across spawns.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.n = 0
+        self.free = list()
+        for name, dtype in FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype))
+        self.leader[:] = -1
+        self.follower[:] = -1
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        for name, dtype in FIELDS:
+            column = np.zeros(capacity, dtype)
+            column[:self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self.leader[self.capacity:] = -1
+        self.follower[self.capacity:] = -1
+        self.capacity = capacity
+
+    def add(self, **values):
+        """Claim a free (or the next) slot, fill it with values and return its index."""
+        if self.free:
+            slot = self.free.pop()
+            for name, dtype in FIELDS:
+                getattr(self, name)[slot] = 0
+            self.leader[slot] = self.follower[slot] = -1
+        else:
+            if self.n == self.capacity:
+                self._grow()
+            slot = self.n
+            self.n += 1
+        for name, value in values.items():
+            getattr(self, name)[slot] = value
+        self.alive[slot] = True
+        return slot
+
+    def release(self, slot):
+        self.alive[slot] = False
+        self.free.append(slot)
+
+    def live(self):
+        """Number of vehicles currently alive."""
+        return self.n - len(self.free)
+
+    def view(self, name):
+        """The in-use part of a column."""
+        return getattr(self, name)[:self.n]
+
+
+def _column(name, cast):
+    def fget(self):
+        return cast(getattr(self.state, name)[self.slot])
+    def fset(self, value):
+        getattr(self.state, name)[self.slot] = value
+    return property(fget, fset)
+
+
+class Vehicle:
+    """
+    Lightweight handle on one slot of a VehicleState. Exposes the same
+    attribute names the old pygame Sprite had, so controller code and the
+    viewer can keep reading v.x, v.crossed, v.vehicleClass, ...
+    """
+    __slots__ = ('state', 'slot')
+
+    def __init__(self, state, slot):
+        self.state = state
+        self.slot = slot
+
+    x = _column('x', float)
+    y = _column('y', float)
+    width = _column('width', float)
+    height = _column('height', float)
+    baseWidth = _column('baseWidth', float)
+    baseHeight = _column('baseHeight', float)
+    speed = _column('speed', float)
+    stop = _column('stop', float)
+    rotateAngle = _column('angle', float)
+    lane = _column('lane', int)
+    direction_number = _column('origin', int)
+    crossed = _column('crossed', int)
+    willTurn = _column('willTurn', int)
+    turned = _column('turned', int)
+
+    @property
+    def direction(self):
+        return directionNumbers[int(self.state.direction[self.slot])]
+
+    @property
+    def vehicleClass(self):
+        return vehicleTypes[int(self.state.cls[self.slot])]
@@ -0,0 +1,140 @@
+# trafficsim/sweep.py
+# Parameter sweeps over the signal timing constants, one headless
+# simulation per (parameter set, seed), spread over every core.
+#
+# usage:
+#   python -m trafficsim.sweep --grid defaultMinimum=8,10,12 carTime=1,2 --seeds 10 --out sweep.csv
+#   python -m trafficsim.sweep --sample 500 --range defaultMinimum=5:20 detectionTime=3:8 --out sweep.csv
+#   python -m trafficsim.sweep --spec sweep.json --out sweep.csv
+#
+# a spec file holds {"grid": {name: [values]}, "seeds": [..], "simTime": ..};
+# use it for tuple-valued parameters such as vehicleWeights.
+
+import argparse
+import ast
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .engine import SimulationEngine, PARAMETERS
+
+KPIS = ('crossed', 'throughput', 'mean_wait', 'emergencies', 'emergency_clearance', 'p95_wait', 'p95_delay',
+        'max_queue', 'wall_time')
+
+
+def grid(**axes):
+    """Every combination of the given parameter values."""
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+def sample(n, seed=None, **ranges):
+    """
+    n random parameter sets. A range is either a (low, high) pair - ints
+    draw integers, floats draw uniformly - or a list of choices.
+    """
+    rng = random.Random(seed)
+    def draw(spec):
+        if isinstance(spec, tuple):
+            low, high = spec
+            if isinstance(low, int) and isinstance(high, int):
+                return rng.randint(low, high)
+            return rng.uniform(low, high)
+        return rng.choice(spec)
+    return [{name: draw(spec) for name, spec in sorted(ranges.items())} for _ in range(n)]
+
+
+def run_one(run, params, seed, simTime):
+    """Worker: one headless simulation, returns a result row."""
+    start = time.perf_counter()
+    engine = SimulationEngine(seed=seed, simTime=simTime, **params)
+    engine.run()
+    row = dict(run=run, seed=seed, **params)
+    row.update(engine.summary())
+    row['wall_time'] = time.perf_counter() - start
+    return row
+
+
+def sweep(param_sets, seeds, out, simTime=3600, workers=None):
+    """
+    Run every parameter set with every seed in a process pool and append
+    each result row to the CSV file `out` as soon as its run finishes.
+    Returns the number of runs.
+    """
+    names = sorted(set().union(*param_sets)) if param_sets else []
+    unknown = set(names) - set(PARAMETERS)
+    if unknown:
+        raise ValueError('unknown simulation parameters: {}'.format(', '.join(sorted(unknown))))
+
+    jobs = [(params, seed) for params in param_sets for seed in seeds]
+    with open(out, 'w', newline='') as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=['run', 'seed'] + names + list(KPIS))
+        writer.writeheader()
+        futures = [pool.submit(run_one, i, params, seed, simTime) for i, (params, seed) in enumerate(jobs)]
+        for done, future in enumerate(as_completed(futures), 1):
+            writer.writerow(future.result())
+            f.flush()
+            print('\r{}/{} runs'.format(done, len(jobs)), end='', file=sys.stderr)
+    print(file=sys.stderr)
+    return len(jobs)
+
+
+# ----------------------
+# CLI
+# ----------------------
+def _value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+def _pairs(items):
+    for item in items:
+        name, _, values = item.partition('=')
+        if not values:
+            raise SystemExit('expected name=values, got {!r}'.format(item))
+        yield name, values
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parallel parameter sweep of the signal simulation')
+    parser.add_argument('--grid', nargs='*', default=[], help='name=v1,v2,... (full factorial)')
+    parser.add_argument('--sample', type=int, default=0, help='draw this many random parameter sets')
+    parser.add_argument('--range', nargs='*', default=[], help='name=low:high or name=v1,v2,... for --sample')
+    parser.add_argument('--spec', help='JSON file with "grid", optional "seeds" and "simTime"')
+    parser.add_argument('--seeds', default='5', help='number of seeds, or a comma separated list')
+    parser.add_argument('--simTime', type=int, default=3600, help='simulated seconds per run')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    parser.add_argument('--out', default='sweep.csv', help='CSV file receiving one row per run')
+    args = parser.parse_args(argv)
+
+    seeds = [int(s) for s in args.seeds.split(',')] if ',' in args.seeds else list(range(int(args.seeds)))
+    simTime = args.simTime
+    if args.spec:
+        with open(args.spec) as f:
+            spec = json.load(f)
+        axes = {name: [tuple(v) if isinstance(v, list) else v for v in values]
+                for name, values in spec['grid'].items()}
+        param_sets = grid(**axes)
+        seeds = spec.get('seeds', seeds)
+        simTime = spec.get('simTime', simTime)
+    elif args.sample:
+        ranges = dict()
+        for name, values in _pairs(args.range):
+            low, sep, high = values.partition(':')
+            ranges[name] = (_value(low), _value(high)) if sep else [_value(v) for v in values.split(',')]
+        param_sets = sample(args.sample, seed=0, **ranges)
+    else:
+        param_sets = grid(**{name: [_value(v) for v in values.split(',')] for name, values in _pairs(args.grid)})
+
+    start = time.perf_counter()
+    runs = sweep(param_sets, seeds, args.out, simTime=simTime, workers=args.workers)
+    print('{} runs on {} workers in {:.1f}s -> {}'.format(
+        runs, args.workers or os.cpu_count(), time.perf_counter() - start, args.out))
+
+
+if __name__ == '__main__':
+    main()
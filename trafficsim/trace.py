@@ -0,0 +1,297 @@
+# trafficsim/trace.py
+# Binary per-frame trace of a run: fixed-width NumPy records in chunks,
+# read back through a memory map with O(1) seeks, for replay in the viewer
+# and for post-mortems without re-simulating.
+#
+# usage:
+#   python simulation.py --headless --seed 1 --trace run.trace
+#   python -m trafficsim.trace info run.trace
+#   python -m trafficsim.trace dump run.trace --at 120.5
+#   python -m trafficsim.trace replay run.trace --at 120 --speed 2
+#
+# file layout (little endian, no padding):
+#   HEADER                          magic, fps, first frame, sizes, directory offset
+#   chunk 0: TICK x ticks, RECORD x vehicles
+#   chunk 1: ...
+#   directory: CHUNK x chunks       written by close()
+#
+# every chunk but the last holds exactly `chunkTicks` frames, so the chunk
+# and the row of any frame follow from its number by division.
+
+import argparse
+import sys
+
+import numpy as np
+
+from . import config
+from .snapshot import Frame, SignalState
+
+MAGIC = b'TSTRACE1'
+noOfSignals = config.noOfSignals
+
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('fps', '<f8'),
+    ('firstFrame', '<i8'),
+    ('chunkTicks', '<i8'),
+    ('ticks', '<i8'),
+    ('vehicles', '<i8'),
+    ('chunks', '<i8'),
+    ('directory', '<i8'),   # file offset of the chunk directory, 0 until closed
+])
+
+# one per frame
+TICK = np.dtype([
+    ('frame', '<i8'),
+    ('clock', '<f8'),
+    ('timeElapsed', '<i4'),
+    ('currentGreen', 'i1'),
+    ('currentYellow', 'i1'),
+    ('nextGreen', 'i1'),
+    ('red', '<i4', noOfSignals),
+    ('yellow', '<i4', noOfSignals),
+    ('green', '<i4', noOfSignals),
+    ('totalGreenTime', '<i4', noOfSignals),
+    ('crossed', '<i4', noOfSignals),
+    ('emergencies_waiting', '<i4'),
+    ('start', '<i4'),       # first RECORD of this frame, counted from the chunk's first record
+    ('count', '<i4'),
+])
+
+# one per live vehicle per frame
+RECORD = np.dtype([
+    ('uid', '<i4'),
+    ('cls', 'i1'),
+    ('direction', 'i1'),
+    ('origin', 'i1'),
+    ('lane', 'i1'),
+    ('crossed', '?'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('angle', '<f4'),
+    ('width', '<f4'),
+    ('height', '<f4'),
+])
+
+CHUNK = np.dtype([
+    ('offset', '<i8'),
+    ('ticks', '<i8'),
+    ('vehicles', '<i8'),
+])
+
+# RECORD field <- VehicleState column
+COLUMNS = (('uid', 'uid'), ('cls', 'cls'), ('direction', 'direction'), ('origin', 'origin'),
+           ('lane', 'lane'), ('crossed', 'crossed'), ('x', 'x'), ('y', 'y'), ('angle', 'angle'),
+           ('width', 'width'), ('height', 'height'))
+
+
+class TraceWriter:
+    """
+    Records every frame of an engine it observes:
+
+        writer = TraceWriter('run.trace', engine.fps)
+        engine.observers.append(writer)
+        engine.run()
+        writer.close()
+
+    Frames are buffered and written one chunk at a time, so memory use is
+    bounded by chunkTicks frames whatever the length of the run. A trace
+    whose writer was never closed has no directory and cannot be read.
+    """
+
+    def __init__(self, path, fps=config.fps, chunkTicks=300):
+        self.file = open(path, 'wb')
+        self.header = np.zeros(1, HEADER)
+        self.header['magic'] = MAGIC
+        self.header['fps'] = fps
+        self.header['firstFrame'] = -1
+        self.header['chunkTicks'] = chunkTicks
+        self.file.write(self.header.tobytes())
+        self.chunkTicks = chunkTicks
+        self.directory = list()
+        self.ticks = np.zeros(chunkTicks, TICK)
+        self.records = list()
+        self.pending = 0    # frames buffered in self.ticks
+        self.buffered = 0   # records buffered in self.records
+
+    def __call__(self, engine):
+        st = engine.state
+        live = np.flatnonzero(st.view('alive'))
+        rows = np.empty(len(live), RECORD)
+        for field, column in COLUMNS:
+            rows[field] = getattr(st, column)[live]
+
+        if self.header['firstFrame'][0] < 0:
+            self.header['firstFrame'] = engine.frame
+        tick = self.ticks[self.pending]
+        tick['frame'] = engine.frame
+        tick['clock'] = engine.clock
+        tick['timeElapsed'] = engine.timeElapsed
+        tick['currentGreen'] = engine.currentGreen
+        tick['currentYellow'] = engine.currentYellow
+        tick['nextGreen'] = engine.nextGreen
+        for i, signal in enumerate(engine.signals):
+            tick['red'][i] = signal.red
+            tick['yellow'][i] = signal.yellow
+            tick['green'][i] = signal.green
+            tick['totalGreenTime'][i] = signal.totalGreenTime
+        tick['crossed'] = engine.counters.crossed
+        tick['emergencies_waiting'] = engine.counters.emergency_waiting()
+        tick['start'] = self.buffered
+        tick['count'] = len(rows)
+
+        self.records.append(rows)
+        self.buffered += len(rows)
+        self.pending += 1
+        if self.pending == self.chunkTicks:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames out as one chunk."""
+        if not self.pending:
+            return
+        self.directory.append((self.file.tell(), self.pending, self.buffered))
+        self.file.write(self.ticks[:self.pending].tobytes())
+        for rows in self.records:
+            self.file.write(rows.tobytes())
+        self.header['ticks'] += self.pending
+        self.header['vehicles'] += self.buffered
+        self.records = list()
+        self.pending = self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.header['chunks'] = len(self.directory)
+        self.header['directory'] = self.file.tell()
+        self.file.write(np.array(self.directory, CHUNK).tobytes())
+        self.file.seek(0)
+        self.file.write(self.header.tobytes())
+        self.file.close()
+
+
+class TraceReader:
+    """
+    Memory-mapped view of a closed trace. Nothing is read up front; a
+    frame is located from its number alone and its vehicles come back as
+    a read-only RECORD array straight out of the map.
+    """
+
+    def __init__(self, path):
+        self.data = np.memmap(path, np.uint8, mode='r')
+        header = np.frombuffer(self.data, HEADER, count=1)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError('{} is not a trace file'.format(path))
+        if header['directory'] == 0:
+            raise ValueError('{} was not closed by its writer'.format(path))
+        self.fps = float(header['fps'])
+        self.firstFrame = int(header['firstFrame'])
+        self.chunkTicks = int(header['chunkTicks'])
+        self.ticks = int(header['ticks'])
+        self.vehicles = int(header['vehicles'])
+        self.directory = np.frombuffer(self.data, CHUNK, count=int(header['chunks']),
+                                       offset=int(header['directory']))
+
+    def __len__(self):
+        return self.ticks
+
+    @property
+    def start(self):
+        return self.firstFrame / self.fps
+
+    @property
+    def duration(self):
+        return self.ticks / self.fps
+
+    def _chunk(self, c):
+        offset, ticks, vehicles = (int(v) for v in self.directory[c])
+        table = np.frombuffer(self.data, TICK, count=ticks, offset=offset)
+        records = np.frombuffer(self.data, RECORD, count=vehicles, offset=offset + ticks * TICK.itemsize)
+        return table, records
+
+    def index(self, time):
+        """Row of the last frame recorded at or before simulated time `time`."""
+        k = int(np.floor(time * self.fps + 1e-6)) - self.firstFrame
+        return min(max(k, 0), self.ticks - 1)
+
+    def tick(self, k):
+        """(TICK record, RECORD array of its vehicles) of the k-th recorded frame."""
+        if not 0 <= k < self.ticks:
+            raise IndexError('frame {} out of range 0..{}'.format(k, self.ticks - 1))
+        table, records = self._chunk(k // self.chunkTicks)
+        tick = table[k % self.chunkTicks]
+        return tick, records[tick['start']:tick['start'] + tick['count']]
+
+    def at(self, time):
+        return self.tick(self.index(time))
+
+    def frame(self, k):
+        """The k-th recorded frame as a snapshot Frame the viewer can draw."""
+        tick, rows = self.tick(k)
+        return Frame(
+            version=k,
+            clock=float(tick['clock']),
+            timeElapsed=int(tick['timeElapsed']),
+            finished=k == self.ticks - 1,
+            currentGreen=int(tick['currentGreen']),
+            currentYellow=int(tick['currentYellow']),
+            nextGreen=int(tick['nextGreen']),
+            signals=tuple(SignalState(*(int(tick[name][i]) for name in SignalState._fields))
+                          for i in range(noOfSignals)),
+            crossed=tuple(tick['crossed'].tolist()),
+            emergencies_waiting=int(tick['emergencies_waiting']),
+            slot=rows['uid'], x=rows['x'], y=rows['y'], width=rows['width'], height=rows['height'],
+            direction=rows['direction'], origin=rows['origin'], cls=rows['cls'],
+            isCrossed=rows['crossed'], angle=rows['angle'],
+        )
+
+    def table(self):
+        """Every TICK record of the run in one array (a copy), for analytics."""
+        if not len(self.directory):
+            return np.zeros(0, TICK)
+        return np.concatenate([self._chunk(c)[0] for c in range(len(self.directory))])
+
+    def chunks(self):
+        """Yield (TICK array, RECORD array) per chunk without copying."""
+        for c in range(len(self.directory)):
+            yield self._chunk(c)
+
+
+def record(engine, path, chunkTicks=300):
+    """Attach a TraceWriter to engine and return it; close it after the run."""
+    writer = TraceWriter(path, engine.fps, chunkTicks)
+    engine.observers.append(writer)
+    return writer
+
+
+# ----------------------
+# CLI
+# ----------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect or replay a simulation trace')
+    parser.add_argument('command', choices=('info', 'dump', 'replay'))
+    parser.add_argument('path')
+    parser.add_argument('--at', type=float, default=0., help='simulated time to dump or to start the replay at')
+    parser.add_argument('--speed', type=float, default=1., help='simulated seconds per wall-clock second in replay')
+    parser.add_argument('--dirty', action='store_true', help='replay with dirty-rect rendering')
+    args = parser.parse_args(argv)
+
+    trace = TraceReader(args.path)
+    if args.command == 'info':
+        print('{} frames at {:g} FPS from t={:.2f}s ({:.1f}s), {} vehicle records in {} chunks'.format(
+            len(trace), trace.fps, trace.start, trace.duration, trace.vehicles, len(trace.directory)))
+    elif args.command == 'dump':
+        tick, rows = trace.at(args.at)
+        np.set_printoptions(linewidth=160, threshold=sys.maxsize)
+        for name in TICK.names:
+            print('{:>20}: {}'.format(name, tick[name]))
+        print(' '.join('{:>9}'.format(name) for name in RECORD.names))
+        for row in rows:
+            print(' '.join('{:>9}'.format(round(v, 2) if isinstance(v, float) else str(v))
+                           for v in row.tolist()))
+    else:
+        from .viewer import Viewer
+        Viewer(None, speed=args.speed, caption='REPLAY ' + args.path, dirty=args.dirty).replay(trace, args.at)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+# trafficsim/viewer.py
+# Optional pygame window attached to a SimulationEngine. The engine never
+# imports this module; the viewer only reads the engine's published
+# snapshots and paces it against the wall clock.
+
+import os
+import threading
+import time
+
+import pygame
+
+from . import config
+from .config import directionNumbers, emergencyClasses, SCREEN_W, SCREEN_H
+from .assets import AssetRegistry
+from .sprites import SpriteCache, TextCache, HaloCache
+
+# set siren path (you provided this path earlier)
+SIREN_PATH = r"C:\Users\91701\Downloads\Adaptive-Traffic-Signal-Timer-main\Adaptive-Traffic-Signal-Timer-main\Code\YOLO\darkflow\siren\siren.wav"
+SIREN_FALLBACKS = (
+    os.path.join(os.path.dirname(config.IMAGE_DIR), 'siren', 'siren.wav'),
+    os.path.join('sounds', 'siren.wav'),
+)
+
+black, white = (0, 0, 0), (255, 255, 255)
+
+DASHBOARD_W = 300
+DASHBOARD_H = 200
+# profiler overlay: re-rendered every OVERLAY_EVERY frames from the mean of the last second
+OVERLAY_EVERY = 15
+
+
+def load_siren():
+    # mixer init may fail on some environments; continue but no sound
+    try:
+        pygame.mixer.init()
+    except Exception:
+        return None
+    if pygame.mixer.get_init() is None:
+        return None
+    for path in (SIREN_PATH,) + SIREN_FALLBACKS:
+        if os.path.exists(path):
+            try:
+                return pygame.mixer.Sound(path)
+            except Exception:
+                return None  # if load fails, continue without sound
+    return None
+
+
+class Viewer:
+    """
+    Draws a SimulationEngine in a pygame window. The engine is paced at
+    speed simulated seconds per wall-clock second, so speed=1 reproduces
+    the old real-time behaviour and larger values fast-forward the run.
+
+    With atlas=True unrotated vehicles are blitted out of one packed
+    texture instead of one surface per image.
+
+    With dirty=True the full-screen background blit is replaced by
+    dirty rectangles: the background, the signal lights and the location
+    label are composed once into a static layer, each frame only the
+    areas covered by last frame's vehicles and texts are restored from
+    it, and only those areas are passed to pygame.display.update.
+
+    With threaded=True the engine runs on its own thread and the window
+    draws whatever snapshot it published last, so a slow frame never
+    holds up the controller.
+
+    With a profiler (profiler.FrameProfiler) every section of the loop is
+    timed per frame and the last second's means are shown in an overlay;
+    the sprite cache statistics are printed when the window closes.
+    """
+
+    def __init__(self, engine, speed=1., caption="SIMULATION", preload=False, atlas=False, dirty=False,
+                 threaded=False, profiler=None):
+        self.engine = engine
+        self.profiler = profiler
+        self.speed = speed
+        self.dirty = dirty
+        self.threaded = threaded
+
+        pygame.init()
+        self.siren = load_siren()
+        self.screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+        pygame.display.set_caption(caption)
+
+        self.assets = AssetRegistry()
+        self.atlas = self.assets.pack() if atlas else None
+        self.background = self.assets.background
+        self.redSignal = self.assets.signal('red')
+        self.yellowSignal = self.assets.signal('yellow')
+        self.greenSignal = self.assets.signal('green')
+
+        self.font = pygame.font.Font(None, 30)
+        self.small_font = pygame.font.Font(None, 18)
+        self.text = TextCache(self.font)
+        self.halos = HaloCache()
+        self.clock = pygame.time.Clock()
+        self.dashboard_rect = pygame.Rect(SCREEN_W - DASHBOARD_W - 10, 10, DASHBOARD_W, DASHBOARD_H)
+        # the dashboard is drawn off-screen and only re-rendered when its values change
+        self.dashboard = pygame.Surface(self.dashboard_rect.size, pygame.SRCALPHA)
+        self.dashboard_values = None
+        self.sprites = SpriteCache(self.assets.vehicle)
+        if preload:
+            self.sprites.preload()
+
+        # dirty-rect mode: static layer, rects drawn this frame and last frame
+        self.static = None
+        self.lights = None
+        self.rects = list()
+        self.previous_rects = list()
+        self.overlay = None
+
+    # ----------------------
+    # Sprites
+    # ----------------------
+    def vehicle_image(self, origin, cls, angle):
+        # sprites come from the spawn direction's folder, rotated while turning
+        return self.sprites.get(directionNumbers[origin], config.vehicleTypes[cls], angle)
+
+    # ----------------------
+    # Drawing
+    # ----------------------
+    def blit(self, surface, pos, area=None):
+        rect = self.screen.blit(surface, pos, area)
+        if self.dirty:
+            self.rects.append(rect)
+        return rect
+
+    def signal_lights(self, frame):
+        """The light and the timer text shown for each signal."""
+        lights, texts = list(), list()
+        for i, signal in enumerate(frame.signals):
+            if i == frame.currentGreen:
+                if frame.currentYellow == 1:
+                    texts.append("STOP" if signal.yellow == 0 else str(signal.yellow))
+                    lights.append(self.yellowSignal)
+                else:
+                    texts.append("SLOW" if signal.green == 0 else str(signal.green))
+                    lights.append(self.greenSignal)
+            else:
+                texts.append("GO" if signal.red <= 10 else "---")
+                lights.append(self.redSignal)
+        return lights, texts
+
+    def draw_static(self, target, lights, lap=None):
+        target.blit(self.background, (0, 0))
+        if lap is not None:
+            lap('background')
+        # Draw traffic signals
+        for i, light in enumerate(lights):
+            target.blit(light, config.signalCoods[i])
+
+    def draw(self, frame=None):
+        """Draw one snapshot of the engine (its latest one by default)."""
+        if frame is None:
+            frame = self.engine.snapshots.latest
+        screen, text, blit = self.screen, self.text.render, self.blit
+        lap = self.profiler.lap if self.profiler is not None else _skip
+        lights, signalTexts = self.signal_lights(frame)
+
+        if not self.dirty:
+            self.draw_static(screen, lights, lap)
+        elif lights != self.lights or self.static is None:
+            # a light changed colour: rebuild the static layer and push the whole screen once
+            self.static = pygame.Surface((SCREEN_W, SCREEN_H)).convert()
+            self.draw_static(self.static, lights)
+            self.static.blit(text("Vidyanagar Cross, Bengaluru", (0, 0, 0), (255, 255, 255)), (20, 20))
+            screen.blit(self.static, (0, 0))
+            self.dashboard_values = None
+            self.previous_rects = [screen.get_rect()]
+        else:
+            # restore what last frame's dynamic items covered
+            for rect in self.previous_rects:
+                screen.blit(self.static, rect, rect)
+        self.lights = lights
+        lap('signals')
+
+        # Signal text & vehicle counts
+        for i in range(config.noOfSignals):
+            blit(text(signalTexts[i], white, black), config.signalTimerCoods[i])
+            blit(text(str(frame.crossed[i]), black, white), config.vehicleCountCoods[i])
+
+        # Time elapsed
+        blit(text("Time Elapsed: "+str(frame.timeElapsed), black, white), (1100, 50))
+        lap('text')
+
+        # Draw vehicles
+        flash = (frame.timeElapsed // 2) % 2 == 0
+        for x, y, origin, cls, angle in zip(frame.x.tolist(), frame.y.tolist(), frame.origin.tolist(),
+                                             frame.cls.tolist(), frame.angle.tolist()):
+            image = self.vehicle_image(origin, cls, angle)
+            vehicleClass = config.vehicleTypes[cls]
+            # Emergency flashing (ambulance, firetruck, vip)
+            if vehicleClass in emergencyClasses:
+                if flash:
+                    blit(self.halos.get(image.get_size()), (x-5, y-5))
+                label = "VIP" if vehicleClass == 'vip' else ("FIRE TRUCK" if vehicleClass == 'firetruck' else "AMBULANCE")
+                blit(text(label, (255,0,0)), (x, y - 20))
+            if self.atlas is not None and angle == 0:
+                blit(self.atlas, (x, y), self.assets.atlas_rect(directionNumbers[origin], vehicleClass))
+            else:
+                blit(image, (x, y))
+        lap('vehicles')
+
+        self.draw_dashboard(frame)
+        lap('dashboard')
+
+        # Location Label
+        if not self.dirty:
+            location_label = text("Vidyanagar Cross, Bengaluru", (0, 0, 0), (255, 255, 255))
+            screen.blit(location_label, (20, 20))
+        lap('text')
+
+        if self.profiler is not None:
+            self.draw_overlay()
+            lap('overlay')
+
+    def present(self):
+        """Push the frame: the whole screen, or only the dirty rectangles."""
+        if not self.dirty:
+            pygame.display.update()
+            return
+        pygame.display.update(self.previous_rects + self.rects)
+        self.previous_rects, self.rects = self.rects, list()
+
+    def draw_dashboard(self, frame):
+        green = frame.currentGreen
+        # an engine without a controller has no green approach
+        values = (frame.crossed, frame.emergencies_waiting, green, frame.signals[green].green if green >= 0 else 0)
+        changed = values != self.dashboard_values
+        if changed:
+            self.dashboard_values = values
+            self.render_dashboard(*values)
+        if not self.dirty:
+            self.screen.blit(self.dashboard, self.dashboard_rect)
+        elif changed or self.dashboard_rect.collidelist(self.previous_rects + self.rects) != -1:
+            self.blit(self.dashboard, self.dashboard_rect)
+
+    def render_dashboard(self, crossed, emergencies_waiting, green, green_time):
+        surface, text = self.dashboard, self.text.render
+        rect = surface.get_rect()
+        surface.fill((0,0,0,0))
+        pygame.draw.rect(surface, (50,50,50), rect, border_radius=8)
+        pygame.draw.rect(surface, (255,255,255), rect, 2, border_radius=8)
+
+        # text positions are relative to the dashboard's top-left corner
+        y_offset = 20 - self.dashboard_rect.y
+        padding_x = SCREEN_W - DASHBOARD_W + 10 - self.dashboard_rect.x
+        for i in range(config.noOfSignals):
+            dir_name = directionNumbers[i]
+            surface.blit(text(f"{dir_name.upper()}: {crossed[i]} crossed", (255,255,255)), (padding_x, y_offset))
+            y_offset += 25
+
+        txt = text(f"EMERGENCIES WAITING: {emergencies_waiting}", (255,0,0) if emergencies_waiting>0 else (0,255,0))
+        surface.blit(txt, (padding_x, y_offset))
+        y_offset += 30
+
+        if green >= 0:
+            surface.blit(text(f"GREEN: {directionNumbers[green].upper()} ({green_time}s)", (0,255,0)), (padding_x, y_offset))
+        else:
+            surface.blit(text("ALL RED", (255,0,0)), (padding_x, y_offset))
+
+    def draw_overlay(self):
+        """Mean ms per section over the last second, bottom left."""
+        profiler = self.profiler
+        if self.overlay is None or profiler.frames % OVERLAY_EVERY == 0:
+            means = profiler.recent(self.engine.fps if self.engine is not None else 30)
+            font = self.small_font
+            names = [name for name in profiler.sections if name != 'idle']
+            self.overlay = pygame.Surface((170, 16 * len(names) + 8), pygame.SRCALPHA)
+            self.overlay.fill((0, 0, 0, 170))
+            for i, name in enumerate(names):
+                color = (255, 255, 0) if name == 'frame' else white
+                self.overlay.blit(font.render(name, True, color), (6, 4 + 16 * i))
+                value = font.render('{:.2f} ms'.format(means[name]), True, color)
+                self.overlay.blit(value, (164 - value.get_width(), 4 + 16 * i))
+        self.blit(self.overlay, (10, SCREEN_H - self.overlay.get_height() - 10))
+
+    def update_siren(self, frame):
+        """Siren plays while any emergency vehicle has not crossed its stop line."""
+        if self.siren is None or pygame.mixer.get_init() is None:
+            return
+        emergency_vehicle_detected = frame.emergencies_waiting > 0
+        try:
+            if emergency_vehicle_detected:
+                if not pygame.mixer.get_busy():
+                    # play looped; -1 means loop indefinitely
+                    self.siren.play(-1)
+            else:
+                self.siren.stop()
+        except Exception:
+            # ignore sound errors and continue
+            pass
+
+    # ----------------------
+    # MAIN LOOP
+    # ----------------------
+    def close(self):
+        if self.profiler is not None:
+            print(self.sprites.stats())
+        try:
+            if self.siren:
+                self.siren.stop()
+        except Exception:
+            pass
+        pygame.quit()
+
+    def _pace(self, wall_start, sim_start, stop):
+        # engine thread: keep catching up with the wall clock, one frame at a time
+        engine = self.engine
+        while not engine.finished and not stop.is_set():
+            target = sim_start + (time.perf_counter() - wall_start) * self.speed
+            engine.run_until(target)
+            ahead = engine.events.peek()
+            if ahead is not None:
+                stop.wait(max(0., (ahead - target) / self.speed))
+
+    def run(self):
+        """
+        Consume engine events paced against the wall clock: every frame the
+        engine catches up to speed x the wall time since the window opened,
+        so a slow frame delays drawing but never the simulation. Returns
+        when the run finishes or the window is closed, with the engine
+        thread (if any) stopped.
+        """
+        wall_start, sim_start = time.perf_counter(), self.engine.clock
+        stop = threading.Event()
+        worker = None
+        if self.threaded:
+            worker = threading.Thread(target=self._pace, args=(wall_start, sim_start, stop), daemon=True)
+            worker.start()
+        snapshots, profiler = self.engine.snapshots, self.profiler
+        lap = profiler.lap if profiler is not None else _skip
+        try:
+            while not snapshots.latest.finished:
+                if profiler is not None:
+                    profiler.begin()
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        return
+                lap('events')
+
+                if not self.threaded:
+                    self.engine.run_until(sim_start + (time.perf_counter() - wall_start) * self.speed)
+                lap('engine')
+                frame = snapshots.latest
+                self.draw(frame)
+                self.update_siren(frame)
+                lap('siren')
+                self.present()
+                lap('update')
+                self.clock.tick(self.engine.fps)
+                lap('idle')
+                if profiler is not None:
+                    profiler.end()
+        finally:
+            # observers (trace writers) must not run after the caller closes them
+            stop.set()
+            if worker is not None:
+                worker.join()
+            self.close()
+
+    def replay(self, trace, start=0.):
+        """
+        Play a recorded trace (a trace.TraceReader) from simulated time
+        `start`. Space pauses, left / right jump 10 simulated seconds.
+        """
+        k = trace.index(start)
+        position, wall = float(k), time.perf_counter()
+        paused = False
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.close()
+                    return
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        paused = not paused
+                    elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                        jump = 10 * trace.fps * (1 if event.key == pygame.K_RIGHT else -1)
+                        position = min(max(position + jump, 0.), len(trace) - 1.)
+
+            now = time.perf_counter()
+            if not paused:
+                position = min(position + (now - wall) * trace.fps * self.speed, len(trace) - 1.)
+            wall = now
+            frame = trace.frame(int(position))
+            self.draw(frame)
+            self.update_siren(frame)
+            self.present()
+            self.clock.tick(trace.fps)
+            if frame.finished and not paused:
+                break
+        self.close()
+
+
+def _skip(name):
+    pass
+
+
+def compare_render_modes(seed=1, warmup=60, frames=300):
+    """
+    Time the full-redraw and the dirty-rect path on the same traffic: both
+    runs replay `frames` frames after `warmup` simulated seconds, without
+    the 30 FPS cap. Returns {mode: (fps, cpu ms per frame)}.
+    """
+    from .engine import SimulationEngine
+    results = dict()
+    for mode, dirty in (('full', False), ('dirty', True)):
+        engine = SimulationEngine(seed=seed)
+        engine.run(warmup)
+        viewer = Viewer(engine, dirty=dirty)
+        start, cpu = time.perf_counter(), time.process_time()
+        for _ in range(frames):
+            pygame.event.pump()
+            engine.step()
+            viewer.draw()
+            viewer.present()
+        wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+        results[mode] = (frames / wall, 1000. * cpu / frames)
+        pygame.quit()
+    return results
@@ -3,25 +3,34 @@ from darkflow.net.build import  TFNet
 import matplotlib.pyplot as plt 
 import os
 
+vehicleLabels=('car','bus','truck')   #COCO labels that are drawn; yolo.cfg has no bike or rickshaw class
+
 options={
    'model':'./cfg/yolo.cfg',        #specifying the path of model
    'load':'./bin/yolov2.weights',   #weights
-   'threshold':0.3                  #minimum confidence factor to create a box, greater than 0.3 good
+   'threshold':0.3,                 #minimum confidence factor to create a box, greater than 0.3 good
+   'nmsClasses':','.join(vehicleLabels)   #only the drawn labels go through NMS
 }
 
 tfnet=TFNet(options)
 inputPath = os.getcwd() + "/test_images/"
 outputPath = os.getcwd() + "/output_images/"
 
-def detectVehicles(filename):
+batchSize=4   # one intersection: four approach cameras per net run
+
+def detectVehicles(filenames):
    global tfnet, inputPath, outputPath
-   img=cv2.imread(inputPath+filename,cv2.IMREAD_COLOR)
+   imgs=[cv2.imread(inputPath+filename,cv2.IMREAD_COLOR) for filename in filenames]
    # img=cv2.cvtColor(img,cv2.COLOR_BGR2RGB)
-   result=tfnet.return_predict(img)
+   results=tfnet.return_predict_batch(imgs)
+   for filename, img, result in zip(filenames, imgs, results):
+      drawVehicles(filename, img, result)
+
+def drawVehicles(filename, img, result):
    # print(result)
    for vehicle in result:
       label=vehicle['label']   #extracting label
-      if(label=="car" or label=="bus" or label=="bike" or label=="truck" or label=="rickshaw"):    # drawing box and writing label
+      if(label in vehicleLabels):    # drawing box and writing label
          top_left=(vehicle['topleft']['x'],vehicle['topleft']['y'])
          bottom_right=(vehicle['bottomright']['x'],vehicle['bottomright']['y'])
          img=cv2.rectangle(img,top_left,bottom_right,(0,255,0),3)    #green box of width 5
@@ -33,8 +42,9 @@ def detectVehicles(filename):
    # plt.show()
    # return result
 
-for filename in os.listdir(inputPath):
-   if(filename.endswith(".png") or filename.endswith(".jpg") or filename.endswith(".jpeg")):
-      detectVehicles(filename)
+filenames=[filename for filename in os.listdir(inputPath)
+           if(filename.endswith(".png") or filename.endswith(".jpg") or filename.endswith(".jpeg"))]
+for i in range(0, len(filenames), batchSize):
+   detectVehicles(filenames[i:i+batchSize])
 print("Done!")
 